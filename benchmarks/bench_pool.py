@@ -0,0 +1,78 @@
+"""Per-call latency of XClient with and without connection pooling.
+
+Runs against a local stub server so results reflect connection setup cost,
+not X API latency:
+
+    python benchmarks/bench_pool.py --calls 500
+"""
+from __future__ import annotations
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from xr.api import XClient
+
+BODY = json.dumps({"data": {"id": "1", "text": "hello"}}).encode()
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+class _UnpooledSession(requests.Session):
+    """Fresh connection per request, like module-level requests.get."""
+
+    def get(self, url, **kwargs):
+        with requests.Session() as s:
+            return s.get(url, **kwargs)
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[idx]
+
+def _run(client: XClient, calls: int) -> list[float]:
+    client.get("tweets/1")  # warm up
+    samples = []
+    for i in range(calls):
+        start = time.perf_counter()
+        client.get(f"tweets/{i}")
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/2"
+
+    try:
+        for label, session in (("unpooled", _UnpooledSession()), ("pooled", None)):
+            with XClient("bench", base_url=base_url, session=session) as client:
+                samples = _run(client, args.calls)
+            print(
+                f"{label:>9}: p50={statistics.median(samples):.3f}ms "
+                f"p99={_percentile(samples, 99):.3f}ms n={len(samples)}"
+            )
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""Allow ``python -m xr``."""
+from xr.cli import main
+
+main()
@@ -2,12 +2,23 @@
 from __future__ import annotations
 import sys
 import time
-from typing import Any
+from typing import Any, Callable, Iterator
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from xr.ratelimit import RateLimiter
 
 API_BASE = "https://api.x.com/2"
 MAX_RETRIES = 3
+DEFAULT_POOL_SIZE = 10
+
+# Error types meaning the resource is gone (deleted, suspended, never
+# existed) or hidden from us (protected): retrying will not help.
+NOT_FOUND_TYPES = {
+    "https://api.twitter.com/2/problems/resource-not-found",
+    "https://api.twitter.com/2/problems/not-authorized-for-resource",
+}
 
 class APIError(Exception):
     def __init__(self, status_code: int, message: str):
@@ -19,28 +30,107 @@ class RateLimitError(APIError):
         self.reset_at = reset_at
         super().__init__(429, f"Rate limited. Resets at {reset_at}")
 
+class NotFoundError(APIError):
+    def __init__(self, resource: str, detail: str):
+        self.resource = resource
+        self.detail = detail
+        super().__init__(404, detail)
+
+class OfflineError(APIError):
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        super().__init__(0, f"offline mode, and {endpoint} is not cached")
+
+def not_found(response: dict[str, Any], resource_type: str) -> dict[str, str]:
+    """Requested values the API reported as missing or not visible, mapped to its explanation."""
+    return {
+        str(e["value"]): e.get("detail") or e.get("title", "Not found")
+        for e in response.get("errors", [])
+        if e.get("type") in NOT_FOUND_TYPES and e.get("resource_type") == resource_type and "value" in e
+    }
+
+def make_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """Keep-alive session with a bounded connection pool."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 class XClient:
-    def __init__(self, bearer_token: str):
+    """X API client.
+
+    Pass either a ``bearer_token`` or a ``token_provider``. The provider is
+    called lazily on the first request (``refresh=False``) and again with
+    ``refresh=True`` if the API rejects the token with a 401.
+
+    With a ``limiter``, every request is paced against the shared per-endpoint
+    budget before it is sent, instead of only reacting to 429s.
+
+    An ``offline`` client never opens a connection: every request raises
+    ``OfflineError``.
+    """
+
+    def __init__(
+        self, bearer_token: str | None = None, pool_size: int = DEFAULT_POOL_SIZE,
+        base_url: str = API_BASE, session: requests.Session | None = None,
+        token_provider: Callable[[bool], str] | None = None,
+        limiter: RateLimiter | None = None, offline: bool = False,
+    ):
+        self.offline = offline
         self.bearer_token = bearer_token
+        self.token_provider = token_provider
+        self.limiter = limiter
+        self.base_url = base_url.rstrip("/")
+        self.session = session or make_session(pool_size)
+
+    def __enter__(self) -> XClient:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+        if self.limiter:
+            self.limiter.close()
 
     def _url(self, endpoint: str) -> str:
-        return f"{API_BASE}/{endpoint}"
+        return f"{self.base_url}/{endpoint}"
+
+    def _token(self, refresh: bool = False) -> str | None:
+        if self.token_provider and (refresh or not self.bearer_token):
+            self.bearer_token = self.token_provider(refresh)
+        return self.bearer_token
 
     def _headers(self) -> dict[str, str]:
         return {
-            "Authorization": f"Bearer {self.bearer_token}",
+            "Authorization": f"Bearer {self._token()}",
             "User-Agent": "xr-cli/0.1.0",
         }
 
     def get(self, endpoint: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
         """Make GET request with retry on rate limit."""
+        if self.offline:
+            raise OfflineError(endpoint)
         url = self._url(endpoint)
+        refreshed = False
         for attempt in range(MAX_RETRIES):
-            resp = requests.get(url, headers=self._headers(), params=params, timeout=15)
+            if self.limiter:
+                self.limiter.acquire(endpoint)
+            resp = self.session.get(url, headers=self._headers(), params=params, timeout=15)
+            if self.limiter:
+                self.limiter.record(endpoint, resp.headers)
 
             if resp.ok:
                 return resp.json()
 
+            if resp.status_code == 401 and self.token_provider and not refreshed:
+                # Cached token was revoked or expired; get a new one once.
+                self._token(refresh=True)
+                refreshed = True
+                continue
+
             if resp.status_code == 429:
                 reset_at = int(resp.headers.get("x-rate-limit-reset", 0))
                 if attempt < MAX_RETRIES - 1:
@@ -50,6 +140,35 @@ class XClient:
                     continue
                 raise RateLimitError(reset_at)
 
+            if resp.status_code == 404:
+                raise NotFoundError(endpoint, resp.text)
             raise APIError(resp.status_code, resp.text)
 
         raise APIError(0, "Max retries exceeded")
+
+def paginate(
+    client: XClient, endpoint: str, params: dict[str, Any] | None = None,
+    max_items: int | None = None, page_size: int = 100, min_page_size: int = 1,
+    token_param: str = "pagination_token",
+) -> Iterator[dict[str, Any]]:
+    """Yield response pages lazily, following ``meta.next_token``.
+
+    Each request asks for at most the number of items still needed, so
+    the last page is not over-fetched. ``max_items=None`` walks every
+    page. ``token_param`` is ``next_token`` for search endpoints and
+    ``pagination_token`` for user timelines and follow graphs.
+    """
+    params = dict(params or {})
+    remaining = max_items
+    while remaining is None or remaining > 0:
+        want = page_size if remaining is None else min(remaining, page_size)
+        params["max_results"] = max(want, min_page_size)
+        page = client.get(endpoint, dict(params))
+        yield page
+        meta = page.get("meta", {})
+        if remaining is not None:
+            remaining -= len(page.get("data", []))
+        next_token = meta.get("next_token")
+        if not next_token:
+            return
+        params[token_param] = next_token
@@ -1,7 +1,10 @@
 """Credential loading and bearer token generation."""
 from __future__ import annotations
 import base64
+import hashlib
+import json
 import os
+import tempfile
 import tomllib
 from pathlib import Path
 
@@ -14,6 +17,13 @@ def _credentials_path() -> Path:
     xdg = os.environ.get("XDG_CONFIG_HOME", str(Path.home() / ".config"))
     return Path(xdg) / "xr" / "credentials.toml"
 
+def _token_cache_path() -> Path:
+    xdg = os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache"))
+    return Path(xdg) / "xr" / "token.json"
+
+def _token_key(consumer_key: str) -> str:
+    return hashlib.sha256(consumer_key.encode()).hexdigest()
+
 def load_credentials(
     path: Path | None = None,
 ) -> tuple[str, str]:
@@ -56,3 +66,42 @@ def get_bearer_token(consumer_key: str, consumer_secret: str) -> str:
     if not resp.ok:
         raise CredentialError(f"Failed to get bearer token: {resp.status_code} {resp.text}")
     return resp.json()["access_token"]
+
+def _read_token_cache(path: Path) -> dict[str, str]:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+def _write_token_cache(path: Path, tokens: dict[str, str]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A private temp file per writer (mkstemp creates it 0600), so processes
+    # refreshing at the same time never write into each other's file.
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(tokens, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def get_cached_bearer_token(
+    consumer_key: str, consumer_secret: str,
+    refresh: bool = False, path: Path | None = None,
+) -> str:
+    """Bearer token from the on-disk cache, generating it on a miss.
+
+    ``refresh=True`` discards the cached token (e.g. after a 401) and
+    fetches a new one.
+    """
+    path = path or _token_cache_path()
+    key = _token_key(consumer_key)
+    tokens = _read_token_cache(path)
+    if not refresh and tokens.get(key):
+        return tokens[key]
+    token = get_bearer_token(consumer_key, consumer_secret)
+    tokens = _read_token_cache(path)
+    tokens[key] = token
+    _write_token_cache(path, tokens)
+    return token
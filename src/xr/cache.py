@@ -1,30 +1,453 @@
 """SQLite cache for API responses."""
 from __future__ import annotations
+import atexit
 import hashlib
 import json
 import os
+import queue
+import random
+import shutil
 import sqlite3
+import sys
+import tempfile
+import threading
 import time
+import zlib
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterable
+
+from xr.query import canonical_query, parse_query
+
+try:  # optional: pip install 'xr-cli[fast]'
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Stay under SQLite's default host-parameter limit on older builds.
+SQL_MAX_VARS = 900
+
+# Primary key of each size-accounted table, in eviction order for ties.
+EVICTABLE = {"tweets": "tweet_id", "users": "user_id", "searches": "query_hash"}
+ACCESS_RESOLUTION = 600     # seconds; reads refresh last_access at most this often
+EVICT_BATCH = 500           # rows deleted per eviction step
+EVICT_TIME_SLICE = 0.05     # seconds an automatic eviction pass may take
+EVICT_TARGET = 0.9          # evict down to this fraction of the limit
+EVICT_CHECK_EVERY = 32      # writes between automatic size checks
+VACUUM_PAGES = 256          # pages released per incremental_vacuum step
+MIGRATE_VACUUM_MAX_MB = 64  # larger legacy files keep their freelist rather than stall on VACUUM
+BUSY_TIMEOUT = 10           # seconds SQLite waits for another process's write lock
+BUSY_RETRIES = 3            # further attempts at a transaction that still found the lock taken
+
+# Counters kept per logical table ("tweets", "users", "searches", "timelines", "counts").
+STAT_TABLES = ("tweets", "users", "searches", "timelines", "counts", "missing")
+STAT_FIELDS = ("hits", "misses", "expired", "reads", "read_seconds", "writes", "write_seconds")
+
+class CodecError(ValueError):
+    """A stored payload cannot be decoded here (unknown tag, missing package, corrupt data)."""
+
+@dataclass(frozen=True)
+class Codec:
+    """Serializer + compressor for cached payloads.
+
+    Encoded blobs start with the codec's one-byte ``tag``, so rows written
+    with any codec (or legacy JSON text) stay readable.
+    """
+    name: str
+    tag: int
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[bytes], Any]
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes], bytes]
+    requires: tuple[str, ...] = ()
+
+    @property
+    def available(self) -> bool:
+        return all(_OPTIONAL[m] is not None for m in self.requires)
+
+    def encode(self, value: Any) -> bytes:
+        return bytes([self.tag]) + self.compress(self.dumps(value))
+
+    def decode(self, blob: bytes) -> Any:
+        if not self.available:
+            raise CodecError(f"Cache entry uses the {self.name} codec; install {' and '.join(self.requires)} to read it")
+        try:
+            return self.loads(self.decompress(blob[1:]))
+        except Exception as e:
+            raise CodecError(f"Corrupt {self.name} cache entry: {e}") from e
+
+_OPTIONAL = {"zstandard": zstandard, "msgpack": msgpack}
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+def _zstd_decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+def _zlib_compress(data: bytes) -> bytes:
+    return zlib.compress(data, 6)
+
+CODECS = {c.name: c for c in (
+    Codec("zlib", 1, _json_dumps, json.loads, _zlib_compress, zlib.decompress),
+    Codec("zstd", 2, _json_dumps, json.loads, _zstd_compress, _zstd_decompress, ("zstandard",)),
+    Codec("msgpack-zlib", 3, lambda v: msgpack.packb(v), lambda b: msgpack.unpackb(b),
+          _zlib_compress, zlib.decompress, ("msgpack",)),
+    Codec("msgpack-zstd", 4, lambda v: msgpack.packb(v), lambda b: msgpack.unpackb(b),
+          _zstd_compress, _zstd_decompress, ("msgpack", "zstandard")),
+)}
+CODEC_TAGS = {c.tag: c for c in CODECS.values()}
+
+def get_codec(name: str = "auto") -> Codec:
+    """Resolve a codec name; ``auto`` picks the best one whose packages are installed."""
+    if name == "auto":
+        return next(CODECS[n] for n in ("msgpack-zstd", "zstd", "msgpack-zlib", "zlib") if CODECS[n].available)
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown cache codec: {name} (choose from auto, {', '.join(CODECS)})")
+    if not codec.available:
+        raise ValueError(f"Cache codec {name} needs {' and '.join(codec.requires)} installed")
+    return codec
+
+def decode(blob: str | bytes) -> Any:
+    """Decode a stored payload: legacy JSON text or a codec-tagged blob.
+
+    Raises ``CodecError`` if it cannot be decoded here; readers treat that as a miss.
+    """
+    if isinstance(blob, str):
+        return json.loads(blob)
+    codec = CODEC_TAGS.get(blob[0]) if blob else None
+    if codec is None:
+        raise CodecError(f"Unknown cache codec tag: {blob[:1].hex()}")
+    return codec.decode(blob)
+
+def fold_username(username: str | None) -> str | None:
+    """Key for the ``users.username`` column: handles are case-insensitive."""
+    return username.lstrip("@").lower() if username else username
+
+GRANULARITY_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+
+def parse_time(value: str) -> float:
+    """Seconds since the epoch for an API timestamp such as ``2026-02-21T15:00:00.000Z``."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+def bucket_complete(bucket: dict, granularity: str, fetched_at: float) -> bool:
+    """A counts bucket is final once it spans its full granularity and has ended."""
+    start, end = parse_time(bucket["start"]), parse_time(bucket["end"])
+    return end - start >= GRANULARITY_SECONDS.get(granularity, 0) and end <= fetched_at
+
+def _index_row(tweet: dict) -> tuple | None:
+    """Row for ``tweet_index`` plus the text for ``tweets_fts``."""
+    tweet_id = str(tweet.get("id", ""))
+    if not tweet_id.isdigit():
+        return None
+    refs = {r.get("type") for r in tweet.get("referenced_tweets") or []}
+    created = tweet.get("created_at")
+    text = (tweet.get("note_tweet") or {}).get("text") or tweet.get("text", "")
+    return (
+        int(tweet_id), tweet.get("author_id"), (tweet.get("lang") or "").lower() or None,
+        int(parse_time(created)) if created else None,
+        "retweeted" in refs, "replied_to" in refs, "quoted" in refs,
+        bool((tweet.get("entities") or {}).get("urls")),
+        bool((tweet.get("attachments") or {}).get("media_keys")),
+        text,
+    )
 
 def _cache_path() -> Path:
     xdg = os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache"))
     return Path(xdg) / "xr" / "cache.db"
 
+def _connect(path: Path) -> sqlite3.Connection:
+    # IMMEDIATE: a write transaction takes the lock when it begins, waiting
+    # up to BUSY_TIMEOUT, instead of failing when it upgrades from a read.
+    # Each thread uses its own connection; closing may happen elsewhere.
+    conn = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT, isolation_level="IMMEDIATE", check_same_thread=False)
+    if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+        # Must be set before the first table exists.
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # REPLACE deletes only fire the size-accounting triggers with this on.
+    conn.execute("PRAGMA recursive_triggers = ON")
+    # WAL + NORMAL: one fsync per checkpoint instead of per commit, and
+    # readers never block the writer.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+WriteOp = Callable[[sqlite3.Connection], None]
+
+def _is_busy(e: sqlite3.OperationalError) -> bool:
+    return "locked" in str(e) or "busy" in str(e)
+
+def _transaction(conn: sqlite3.Connection, ops: list[WriteOp]):
+    """Apply ``ops`` in one transaction, retried with backoff while other
+    processes keep the database locked past the busy timeout."""
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            with conn:
+                for op in ops:
+                    op(conn)
+            return
+        except sqlite3.OperationalError as e:
+            if attempt == BUSY_RETRIES or not _is_busy(e):
+                raise
+            time.sleep(random.uniform(0.5, 1) * 2 ** attempt)
+
+class _WriteBehind(threading.Thread):
+    """Applies queued write ops on its own connection, grouping whatever is
+    queued into one transaction."""
+
+    MAX_BATCH = 256
+
+    def __init__(self, path: Path):
+        super().__init__(name="xr-cache-writer", daemon=True)
+        self.path = path
+        self.ops: queue.Queue[WriteOp | None] = queue.Queue()
+
+    def run(self):
+        conn = _connect(self.path)
+        stop = False
+        while not stop:
+            batch = [self.ops.get()]
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    batch.append(self.ops.get_nowait())
+                except queue.Empty:
+                    break
+            ops = [op for op in batch if op is not None]
+            stop = len(ops) < len(batch)
+            try:
+                _transaction(conn, ops)
+            except sqlite3.Error as e:
+                print(f"Cache write failed: {e}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    self.ops.task_done()
+        conn.close()
+
+    def submit(self, op: WriteOp):
+        self.ops.put(op)
+
+    def flush(self):
+        self.ops.join()
+
+    def stop(self):
+        self.ops.put(None)
+        self.join()
+
+class MemoryTier:
+    """Bounded in-process LRU of already-decoded cache entries.
+
+    Evicts least recently used entries once either ``max_entries`` or
+    ``max_bytes`` (measured as the size of the stored, usually compressed,
+    payload, so decoded objects take several times that) is exceeded.
+    Entries keep their ``fetched_at`` so TTLs behave as in SQLite.
+    Returned objects are shared: treat them as read-only.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[tuple[str, str], tuple[Any, float, int]] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, table: str, key: str, ttl: int) -> Any | None:
+        with self._lock:
+            item = self._items.get((table, key))
+            if item is None or (time.time() - item[1]) >= ttl:
+                self.misses += 1
+                return None
+            self._items.move_to_end((table, key))
+            self.hits += 1
+            return item[0]
+
+    def put(self, table: str, key: str, value: Any, fetched_at: float, size: int):
+        with self._lock:
+            self.discard(table, key)
+            if size > self.max_bytes:
+                return
+            self._items[(table, key)] = (value, fetched_at, size)
+            self.bytes += size
+            while len(self._items) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self._items.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self, table: str | None = None):
+        with self._lock:
+            if table is None:
+                self._items.clear()
+                self.bytes = 0
+                return
+            for key in [k for k in self._items if k[0] == table]:
+                self.discard(*key)
+
+    def discard(self, table: str, key: str):
+        with self._lock:
+            item = self._items.pop((table, key), None)
+            if item:
+                self.bytes -= item[2]
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._items), "bytes": self.bytes, "hits": self.hits, "misses": self.misses}
+
 class Cache:
-    def __init__(self, path: Path | None = None, enabled: bool = True):
+    """SQLite cache.
+
+    Tweets are stored without their page-level ``includes``: each row keeps
+    the tweet object and its ``author_id``, and authors live once in
+    ``users``. Reads rebuild ``{"data": ..., "includes": {"users": [author]}}``
+    so callers see the same shape the API returned.
+
+    Every ``put_*`` call is one transaction. With ``write_behind=True``
+    writes are queued to a background thread and committed in groups;
+    they become visible to ``get_*`` after ``flush()``, and ``close()``
+    (also run at interpreter exit) persists anything still queued.
+
+    ``memory_entries > 0`` puts a ``MemoryTier`` in front of the tables so
+    repeated reads within one process skip SQLite and JSON decoding.
+
+    Every row records its payload ``size`` and ``last_access``; per-table
+    totals live in ``usage``. With ``max_size_mb`` set, the cache evicts the
+    least recently read rows in short time slices (every few writes and on
+    ``close()``) whenever the database (``db_bytes()``) exceeds the limit.
+
+    Tweet and user payloads are stored as ``codec``-encoded blobs
+    (see ``CODECS``); ``recompress()`` rewrites older rows.
+
+    Several processes can share one file: connections wait for and retry
+    write locks (``BUSY_TIMEOUT``, ``BUSY_RETRIES``) and migrations run
+    under the write lock. ``conn`` is per thread, so one ``Cache`` can be
+    used from several threads.
+
+    Tweets and users the API reported as missing are remembered as
+    negative entries for ``ttl_missing`` seconds.
+
+    With ``stale_ok``, expired entries are returned instead of treated as
+    misses, and ``served_stale`` records that at least one was.
+
+    Reads count hits, misses and expired entries per table and time every
+    ``get_*``/``put_*``; ``close()`` adds the counters to ``cache_stats``
+    and ``stats()`` reports them with the size breakdown.
+    """
+
+    def __init__(
+        self, path: Path | None = None, enabled: bool = True, write_behind: bool = False,
+        memory_entries: int = 0, memory_bytes: int = 16 * 1024 * 1024,
+        max_size_mb: float | None = None, codec: str = "auto", stale_ok: bool = False,
+        ttl_missing: int = 86400,
+    ):
         self.enabled = enabled
+        self.stale_ok = stale_ok
+        self.ttl_missing = ttl_missing
+        self.served_stale = False
         self.path = path or _cache_path()
+        self.codec = get_codec(codec)
+        self.max_size_mb = max_size_mb
+        self._writes = 0
+        self._stats: defaultdict[str, Counter] = defaultdict(Counter)
+        self._stats_lock = threading.Lock()
+        self._writer: _WriteBehind | None = None
+        self.memory = MemoryTier(memory_entries, memory_bytes) if memory_entries > 0 else None
+        self._local = threading.local()
+        self._conns: list[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._closed = not enabled
         if self.enabled:
             self.path.parent.mkdir(parents=True, exist_ok=True)
-            self.conn = sqlite3.connect(str(self.path))
-            self._init_tables()
+            self._migrate()
+            if write_behind:
+                self._writer = _WriteBehind(self.path)
+                self._writer.start()
+                atexit.register(self.close)
+
+    @property
+    def conn(self) -> sqlite3.Connection | None:
+        """This thread's connection; ``None`` once closed or when disabled."""
+        if self._closed:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def __enter__(self) -> Cache:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def flush(self):
+        """Wait until queued write-behind ops are committed."""
+        if self._writer:
+            self._writer.flush()
+
+    def close(self):
+        if self._writer:
+            self._writer.stop()
+            self._writer = None
+            atexit.unregister(self.close)
+        if self.conn:
+            self._save_stats()
+            self._maybe_evict()
+            self._closed = True
+            with self._conns_lock:
+                for conn in self._conns:
+                    conn.close()
+                self._conns.clear()
+
+    def _write(self, op: WriteOp, table: str | None = None):
+        """Run ``op(conn)`` in a single transaction, now or on the writer thread.
+
+        With ``table``, the time spent in ``op`` counts towards its write stats.
+        """
+        if table is not None:
+            untimed = op
+
+            def op(conn: sqlite3.Connection):
+                started = time.perf_counter()
+                untimed(conn)
+                self._count(table, writes=1, write_seconds=time.perf_counter() - started)
+        if self._writer:
+            self._writer.submit(op)
         else:
-            self.conn = None
+            _transaction(self.conn, [op])
+        self._writes += 1
+        if self._writes % EVICT_CHECK_EVERY == 0:
+            self._maybe_evict()
+
+    def _count(self, table: str, **counts: float):
+        with self._stats_lock:
+            self._stats[table].update(counts)
+
+    def _record_read(self, table: str, started: float, hits: int = 0, misses: int = 0, expired: int = 0):
+        self._count(table, hits=hits, misses=misses, expired=expired,
+                    reads=1, read_seconds=time.perf_counter() - started)
+
+    def _touch(self, table: str, keys: list[str]):
+        """Record a read, so eviction keeps recently used rows."""
+        if keys:
+            rows = [(time.time(), k) for k in keys]
+            self._write(lambda conn: conn.executemany(
+                f"UPDATE {table} SET last_access = ? WHERE {EVICTABLE[table]} = ?", rows,
+            ))
 
     def _init_tables(self):
-        self.conn.executescript("""
+        self._executescript("""
             CREATE TABLE IF NOT EXISTS tweets (
                 tweet_id TEXT PRIMARY KEY,
                 data TEXT NOT NULL,
@@ -51,108 +474,1130 @@ class Cache:
             );
         """)
 
+    def _migrate(self):
+        """Bring the schema up to date, one committed step per version.
+
+        Each step holds the write lock from reading ``user_version`` to
+        bumping it, so concurrent processes never run a step twice.
+        """
+        steps = [
+            self._migrate_v1, self._migrate_v2, self._migrate_v3, self._migrate_v4,
+            self._migrate_v5, self._migrate_v6, self._migrate_v7, self._migrate_v8,
+            self._migrate_v9, self._migrate_v10, self._migrate_v11,
+        ]
+        self._vacuum_after_migrate = False
+        while (version := self.conn.execute("PRAGMA user_version").fetchone()[0]) < len(steps):
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.conn.execute("PRAGMA user_version").fetchone()[0] == version:
+                    if version == 0:
+                        self._init_tables()
+                    steps[version]()
+                    self.conn.execute(f"PRAGMA user_version = {version + 1}")
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        if self._vacuum_after_migrate:
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.conn.execute("VACUUM")
+        # If other processes ran every step, this connection still holds the
+        # schema it saw at connect time (possibly empty), and statements are
+        # prepared before their transaction begins: a read refreshes it.
+        self.conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+    def _executescript(self, script: str):
+        """Like ``executescript``, but inside the current transaction."""
+        statement = ""
+        for line in script.splitlines(keepends=True):
+            statement += line
+            if sqlite3.complete_statement(statement):
+                self.conn.execute(statement)
+                statement = ""
+
+    def _migrate_v1(self):
+        """Normalize tweets: move embedded includes into the users table."""
+        self._executescript("""
+            ALTER TABLE tweets ADD COLUMN author_id TEXT;
+            ALTER TABLE users ADD COLUMN partial INTEGER NOT NULL DEFAULT 0;
+        """)
+        tweets, authors = [], {}
+        for tweet_id, data, fetched_at in self.conn.execute("SELECT tweet_id, data, fetched_at FROM tweets").fetchall():
+            payload = json.loads(data)
+            if "data" in payload:
+                self._tweet_rows(tweet_id, payload, fetched_at, tweets, authors)
+        # Written against the v1 schema; later columns are backfilled by their own steps.
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO tweets (tweet_id, data, fetched_at, author_id) VALUES (?, ?, ?, ?)", tweets,
+        )
+        self.conn.executemany(
+            "UPDATE users SET username = NULL WHERE username = ? AND user_id != ?",
+            [(u.get("username"), u["id"]) for u, _ in authors.values()],
+        )
+        self.conn.executemany("""
+            INSERT INTO users (user_id, username, data, fetched_at, partial) VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username, data = excluded.data, fetched_at = excluded.fetched_at
+            WHERE users.partial = 1
+        """, [(u["id"], u.get("username"), self.codec.encode({"data": u}), ts) for u, ts in authors.values()])
+
+    def _migrate_v2(self):
+        """Shrink user rows that stored a whole followers page to the user's own record."""
+        rows = self.conn.execute(
+            "SELECT user_id, data FROM users WHERE data LIKE '{\"data\": {\"data\": [%'"
+        ).fetchall()
+        for user_id, data in rows:
+            page = decode(data)["data"]
+            own = next((u for u in page.get("data", []) if u.get("id") == user_id), None)
+            if own:
+                self.conn.execute("UPDATE users SET data = ? WHERE user_id = ?", (self.codec.encode({"data": own}), user_id))
+            else:
+                self.conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+
+    def _migrate_v3(self):
+        """Per-row size and last access, per-table usage totals, incremental vacuum."""
+        script = ["CREATE TABLE usage (tbl TEXT PRIMARY KEY, rows INTEGER NOT NULL, bytes INTEGER NOT NULL);"]
+        for table in ("tweets", "users", "searches", "counts"):
+            payload = "result_ids" if table == "searches" else "data"
+            script.append(f"""
+                ALTER TABLE {table} ADD COLUMN last_access REAL NOT NULL DEFAULT 0;
+                ALTER TABLE {table} ADD COLUMN size INTEGER NOT NULL DEFAULT 0;
+                UPDATE {table} SET last_access = fetched_at, size = length(CAST({payload} AS BLOB));
+                CREATE INDEX idx_{table}_last_access ON {table}(last_access);
+                INSERT INTO usage SELECT '{table}', COUNT(*), COALESCE(SUM(size), 0) FROM {table};
+                CREATE TRIGGER {table}_usage_insert AFTER INSERT ON {table} BEGIN
+                    UPDATE usage SET rows = rows + 1, bytes = bytes + new.size WHERE tbl = '{table}';
+                END;
+                CREATE TRIGGER {table}_usage_delete AFTER DELETE ON {table} BEGIN
+                    UPDATE usage SET rows = rows - 1, bytes = bytes - old.size WHERE tbl = '{table}';
+                END;
+                CREATE TRIGGER {table}_usage_update AFTER UPDATE OF size ON {table} BEGIN
+                    UPDATE usage SET bytes = bytes + new.size - old.size WHERE tbl = '{table}';
+                END;
+            """)
+        self._executescript("\n".join(script))
+        auto_vacuum = self.conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        size_mb = self.path.stat().st_size / (1024 * 1024)
+        # VACUUM cannot run inside the migration's transaction.
+        self._vacuum_after_migrate = auto_vacuum != 2 and size_mb <= MIGRATE_VACUUM_MAX_MB
+
+    def _migrate_v4(self):
+        """Case-fold usernames; on collisions the most recently fetched row keeps the handle."""
+        self._executescript("""
+            UPDATE users SET username = NULL WHERE username IS NOT NULL AND EXISTS (
+                SELECT 1 FROM users o
+                WHERE lower(o.username) = lower(users.username) AND o.user_id != users.user_id
+                  AND (o.fetched_at > users.fetched_at OR (o.fetched_at = users.fetched_at AND o.user_id > users.user_id))
+            );
+            UPDATE users SET username = lower(username) WHERE username IS NOT NULL;
+        """)
+
+    def _migrate_v5(self):
+        """Cursor metadata so expired searches can be refreshed with since_id."""
+        self._executescript("""
+            ALTER TABLE searches ADD COLUMN newest_id TEXT;
+            ALTER TABLE searches ADD COLUMN oldest_id TEXT;
+            ALTER TABLE searches ADD COLUMN next_token TEXT;
+        """)
+
+    def _migrate_v6(self):
+        """Per-user timeline index with head/tail watermarks."""
+        self._executescript("""
+            CREATE TABLE timelines (
+                user_id TEXT PRIMARY KEY,
+                newest_id INTEGER,
+                oldest_id INTEGER,
+                complete INTEGER NOT NULL DEFAULT 0,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE timeline_tweets (
+                user_id TEXT NOT NULL,
+                tweet_id INTEGER NOT NULL,
+                PRIMARY KEY (user_id, tweet_id)
+            ) WITHOUT ROWID;
+        """)
+
+    def _migrate_v7(self):
+        """Store count time series as one row per bucket; drop the blob table."""
+        self._executescript("""
+            CREATE TABLE count_series (
+                query_hash TEXT NOT NULL,
+                granularity TEXT NOT NULL,
+                query TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (query_hash, granularity)
+            );
+            CREATE TABLE count_buckets (
+                query_hash TEXT NOT NULL,
+                granularity TEXT NOT NULL,
+                start TEXT NOT NULL,
+                end TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                complete INTEGER NOT NULL,
+                PRIMARY KEY (query_hash, granularity, start)
+            ) WITHOUT ROWID;
+        """)
+        for query, granularity, data, fetched_at in self.conn.execute(
+            "SELECT query, granularity, data, fetched_at FROM counts"
+        ).fetchall():
+            self._write_count_buckets(self.conn, query, granularity, decode(data).get("buckets", []), fetched_at)
+        self._executescript("""
+            DROP TABLE counts;
+            DELETE FROM usage WHERE tbl = 'counts';
+        """)
+
+    def _migrate_v8(self):
+        """Full-text index over cached tweets, kept in sync with ``tweets``."""
+        self._executescript("""
+            CREATE TABLE tweet_index (
+                tweet_id INTEGER PRIMARY KEY,
+                author_id TEXT,
+                lang TEXT,
+                created_at INTEGER,
+                is_retweet INTEGER NOT NULL,
+                is_reply INTEGER NOT NULL,
+                is_quote INTEGER NOT NULL,
+                has_links INTEGER NOT NULL,
+                has_media INTEGER NOT NULL
+            );
+            CREATE INDEX idx_tweet_index_author ON tweet_index(author_id);
+            CREATE INDEX idx_tweet_index_created ON tweet_index(created_at);
+            CREATE VIRTUAL TABLE tweets_fts USING fts5(text, tokenize = 'unicode61 remove_diacritics 2');
+            CREATE TRIGGER tweets_index_delete AFTER DELETE ON tweets BEGIN
+                DELETE FROM tweet_index WHERE tweet_id = CAST(old.tweet_id AS INTEGER);
+                DELETE FROM tweets_fts WHERE rowid = CAST(old.tweet_id AS INTEGER);
+            END;
+        """)
+        self.rebuild_index()
+
+    def _migrate_v9(self):
+        """Persistent hit/miss and latency counters."""
+        self.conn.execute("""
+            CREATE TABLE cache_stats (
+                tbl TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                expired INTEGER NOT NULL DEFAULT 0,
+                reads INTEGER NOT NULL DEFAULT 0,
+                read_seconds REAL NOT NULL DEFAULT 0,
+                writes INTEGER NOT NULL DEFAULT 0,
+                write_seconds REAL NOT NULL DEFAULT 0
+            )
+        """)
+
+    def _migrate_v10(self):
+        """Negative entries for tweets and users the API reported missing."""
+        self.conn.execute("""
+            CREATE TABLE missing (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (kind, key)
+            ) WITHOUT ROWID
+        """)
+
+    def _migrate_v11(self):
+        """Key searches by canonical query and sort order, and record whether a result is complete.
+
+        Older rows cannot be rekeyed: their sort order was never stored.
+        """
+        self._executescript("""
+            ALTER TABLE searches ADD COLUMN complete INTEGER NOT NULL DEFAULT 0;
+            DELETE FROM searches;
+        """)
+
+    def rebuild_index(self, batch: int = 1000):
+        """Re-derive ``tweet_index`` and ``tweets_fts`` from the stored tweets."""
+        self.conn.execute("DELETE FROM tweet_index")
+        self.conn.execute("DELETE FROM tweets_fts")
+        last = ""
+        while True:
+            rows = self.conn.execute(
+                "SELECT tweet_id, data FROM tweets WHERE tweet_id > ? ORDER BY tweet_id LIMIT ?", (last, batch)
+            ).fetchall()
+            if not rows:
+                break
+            last = rows[-1][0]
+            self._index_rows(rows)
+
+    def _index_rows(self, rows: list):
+        index = {}
+        for _, data in rows:
+            try:
+                tweet = decode(data)
+            except CodecError:
+                continue
+            row = _index_row(tweet.get("data", tweet))
+            if row:
+                index[row[0]] = row
+        self._write_index(self.conn, index)
+
+    @staticmethod
+    def _write_index(conn: sqlite3.Connection, index: dict):
+        conn.executemany(
+            "INSERT OR REPLACE INTO tweet_index (tweet_id, author_id, lang, created_at,"
+            " is_retweet, is_reply, is_quote, has_links, has_media) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [row[:-1] for row in index.values()],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO tweets_fts (rowid, text) VALUES (?, ?)",
+            [(row[0], row[-1]) for row in index.values()],
+        )
+
     def _is_fresh(self, fetched_at: float, ttl: int) -> bool:
-        return (time.time() - fetched_at) < ttl
+        if (time.time() - fetched_at) < ttl:
+            return True
+        if self.stale_ok:
+            self.served_stale = True
+            return True
+        return False
 
     def _query_hash(self, query: str) -> str:
         return hashlib.sha256(query.strip().lower().encode()).hexdigest()
 
+    def _search_hash(self, query: str, sort: str) -> str:
+        key = canonical_query(query) if sort == "recency" else f"{canonical_query(query)} sort_order:{sort}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
     # --- Tweets ---
+    _TWEET_SELECT = """
+        SELECT t.tweet_id, t.data, t.fetched_at, u.data, t.author_id, t.last_access, u.last_access
+        FROM tweets t LEFT JOIN users u ON u.user_id = t.author_id
+    """
+
+    def _load_tweet(self, payload: dict, author: str | None, authors: dict | None = None) -> dict:
+        """Attach the author row to a decoded tweet; ``authors`` memoizes decoded
+        author rows across a batch."""
+        if "data" not in payload:
+            return payload
+        if author is None:
+            payload["includes"] = {}
+            return payload
+        authors = {} if authors is None else authors
+        if author not in authors:
+            author_data = decode(author)
+            authors[author] = {"users": [author_data.get("data", author_data)]}
+        payload["includes"] = authors[author]
+        return payload
+
+    def _remember(self, table: str, key: str, value: Any, fetched_at: float, size: int):
+        if self.memory is not None:
+            self.memory.put(table, key, value, fetched_at, size)
+
+    def _drop(self, table: str, keys: list[str]):
+        """Delete rows whose payload cannot be decoded here, so they are refetched."""
+        if keys:
+            rows = [(k,) for k in keys]
+            self._write(lambda conn: conn.executemany(f"DELETE FROM {table} WHERE {EVICTABLE[table]} = ?", rows))
+
+    def _forget(self, table: str, keys: Iterable[str]):
+        if self.memory is not None:
+            for key in keys:
+                self.memory.discard(table, key)
+
     def get_tweet(self, tweet_id: str, ttl: int) -> dict | None:
         if not self.enabled or not self.conn:
             return None
-        row = self.conn.execute(
-            "SELECT data, fetched_at FROM tweets WHERE tweet_id = ?", (tweet_id,)
-        ).fetchone()
-        if row and self._is_fresh(row[1], ttl):
-            return json.loads(row[0])
-        return None
+        return self.get_tweets([tweet_id], ttl).get(tweet_id)
+
+    def get_tweets(self, tweet_ids: list[str], ttl: int) -> dict[str, dict]:
+        """Fresh cached tweets for ``tweet_ids``, keyed by ID in input order.
+
+        One ``IN (...)`` query per 900 IDs; misses and expired rows are
+        simply absent from the result.
+        """
+        if not self.enabled or not self.conn or not tweet_ids:
+            return {}
+        started = time.perf_counter()
+        found = {}
+        if self.memory is not None:
+            for tweet_id in tweet_ids:
+                hit = self.memory.get("tweets", tweet_id, ttl)
+                if hit is not None:
+                    found[tweet_id] = hit
+        missing = [tid for tid in tweet_ids if tid not in found]
+        rows = {}
+        for i in range(0, len(missing), SQL_MAX_VARS):
+            chunk = missing[i:i + SQL_MAX_VARS]
+            for row in self.conn.execute(
+                f"{self._TWEET_SELECT} WHERE t.tweet_id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ):
+                rows[row[0]] = row
+        authors: dict[str, dict] = {}
+        stale_before = time.time() - ACCESS_RESOLUTION
+        touch_tweets, touch_users = [], set()
+        unreadable_tweets, unreadable_users = [], set()
+        expired = 0
+        for tweet_id in missing:
+            row = rows.get(tweet_id)
+            if not row or tweet_id in found:
+                continue
+            if not self._is_fresh(row[2], ttl):
+                expired += 1
+                continue
+            _, data, fetched_at, author, author_id, last_access, author_access = row
+            if author_id and author is None:
+                continue  # author row was evicted; refetch rather than show "unknown"
+            try:
+                payload = decode(data)
+            except CodecError:
+                unreadable_tweets.append(tweet_id)
+                continue
+            try:
+                found[tweet_id] = self._load_tweet(payload, author, authors)
+            except CodecError:
+                unreadable_users.add(author_id)
+                continue
+            self._remember("tweets", tweet_id, found[tweet_id], fetched_at, len(data) + len(author or ""))
+            if last_access < stale_before:
+                touch_tweets.append(tweet_id)
+            if author_access is not None and author_access < stale_before:
+                touch_users.add(author_id)
+        self._touch("tweets", touch_tweets)
+        self._touch("users", sorted(touch_users))
+        self._drop("tweets", unreadable_tweets)
+        self._drop("users", sorted(unreadable_users))
+        result = {tid: found[tid] for tid in tweet_ids if tid in found}
+        self._record_read("tweets", started, hits=len(result), expired=expired,
+                          misses=len(set(tweet_ids)) - len(result) - expired)
+        return result
 
     def put_tweet(self, tweet_id: str, data: dict):
+        self.put_tweets([(tweet_id, data)])
+
+    def put_tweets(self, items: Iterable[tuple[str, dict]]):
+        """Store ``(tweet_id, payload)`` pairs in one transaction."""
         if not self.enabled or not self.conn:
             return
-        self.conn.execute(
-            "INSERT OR REPLACE INTO tweets (tweet_id, data, fetched_at) VALUES (?, ?, ?)",
-            (tweet_id, json.dumps(data), time.time()),
+        now = time.time()
+        tweets, authors, index, maps = [], {}, {}, {}
+        for tweet_id, payload in items:
+            self._tweet_rows(tweet_id, payload, now, tweets, authors, index, maps)
+        if tweets:
+            self._forget("tweets", (row[0] for row in tweets))
+            self._write(lambda conn: self._write_tweets(conn, tweets, authors, index), "tweets")
+
+    def _tweet_rows(
+        self, tweet_id: str, payload: dict, fetched_at: float, tweets: list, authors: dict,
+        index: dict | None = None, maps: dict | None = None,
+    ):
+        """Flatten a payload into tweet rows plus author records (deduplicated by ID).
+
+        Referenced tweets from ``includes`` get rows of their own when their
+        author is included too.
+
+        Items of one page share its ``includes``; ``maps`` indexes each
+        includes object once per batch instead of scanning it per tweet.
+        """
+        tweet = payload.get("data", payload)
+        if index is not None and (row := _index_row(tweet)):
+            index[row[0]] = row
+        if "data" not in payload:
+            tweets.append((tweet_id, self.codec.encode(payload), fetched_at, None))
+            return
+        includes = payload.get("includes") or {}
+        _, users, included = self._includes_maps(includes, {} if maps is None else maps)
+        author_id = tweet.get("author_id")
+        tweets.append((tweet_id, self.codec.encode({"data": tweet}), fetched_at, author_id))
+        if author_id in users:
+            authors[author_id] = (users[author_id], fetched_at)
+        for ref in dict.fromkeys(r.get("id") for r in tweet.get("referenced_tweets") or []):
+            # Without its author in the includes, get_tweets could never serve it.
+            if ref in included and ref != tweet_id and included[ref].get("author_id") in users:
+                rt = included[ref]
+                self._tweet_rows(ref, {"data": rt, "includes": includes}, fetched_at, tweets, authors, index, maps)
+
+    @staticmethod
+    def _includes_maps(includes: dict, maps: dict) -> tuple[dict, dict, dict]:
+        """``(includes, users by ID, tweets by ID)``, memoized in ``maps``;
+        holding ``includes`` keeps its ``id()`` from being reused."""
+        if id(includes) not in maps:
+            maps[id(includes)] = (
+                includes,
+                {u.get("id"): u for u in includes.get("users", [])},
+                {t.get("id"): t for t in includes.get("tweets", [])},
+            )
+        return maps[id(includes)]
+
+    def _write_tweets(self, conn: sqlite3.Connection, tweets: list, authors: dict, index: dict):
+        conn.executemany(
+            "INSERT OR REPLACE INTO tweets (tweet_id, data, fetched_at, author_id, last_access, size)"
+            " VALUES (?1, ?2, ?3, ?4, ?3, length(CAST(?2 AS BLOB)))",
+            tweets,
+        )
+        # Authors from tweet includes are partial records: they must not
+        # clobber a full profile.
+        rows = [(u["id"], fold_username(u.get("username")), self.codec.encode({"data": u}), ts)
+                for u, ts in authors.values()]
+        conn.executemany("DELETE FROM missing WHERE kind = 'tweet' AND key = ?", [(row[0],) for row in tweets])
+        self._release_usernames(conn, rows)
+        conn.executemany("""
+            INSERT INTO users (user_id, username, data, fetched_at, partial, last_access, size)
+            VALUES (?1, ?2, ?3, ?4, 1, ?4, length(CAST(?3 AS BLOB)))
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username, data = excluded.data, fetched_at = excluded.fetched_at,
+                last_access = excluded.last_access, size = excluded.size
+            WHERE users.partial = 1
+        """, rows)
+        self._write_index(conn, index)
+
+    @staticmethod
+    def _release_usernames(conn: sqlite3.Connection, rows: list):
+        """A handle now owned by another account moves to that ID; the old
+        row stays reachable by ID."""
+        conn.executemany(
+            "UPDATE users SET username = NULL WHERE username = ? AND user_id != ?",
+            [(username, user_id) for user_id, username, *_ in rows if username],
         )
-        self.conn.commit()
 
     # --- Users ---
     def get_user(self, username: str, ttl: int) -> dict | None:
+        """Full profile by handle, matched case-insensitively."""
+        return self._get_user("username", fold_username(username), ttl)
+
+    def get_user_by_id(self, user_id: str, ttl: int) -> dict | None:
+        """Full profile by numeric ID (e.g. a tweet's ``author_id``)."""
+        return self._get_user("user_id", user_id, ttl)
+
+    def _get_user(self, column: str, key: str, ttl: int) -> dict | None:
         if not self.enabled or not self.conn:
             return None
+        started = time.perf_counter()
+        if self.memory is not None and (hit := self.memory.get(f"users.{column}", key, ttl)) is not None:
+            self._record_read("users", started, hits=1)
+            return hit
         row = self.conn.execute(
-            "SELECT data, fetched_at FROM users WHERE username = ?", (username,)
+            f"SELECT data, fetched_at, user_id, last_access FROM users WHERE {column} = ? AND partial = 0", (key,)
         ).fetchone()
         if row and self._is_fresh(row[1], ttl):
-            return json.loads(row[0])
+            try:
+                value = decode(row[0])
+            except CodecError:
+                self._drop("users", [row[2]])
+                self._record_read("users", started, misses=1)
+                return None
+            self._remember(f"users.{column}", key, value, row[1], len(row[0]))
+            if row[3] < time.time() - ACCESS_RESOLUTION:
+                self._touch("users", [row[2]])
+            self._record_read("users", started, hits=1)
+            return value
+        self._record_read("users", started, misses=int(not row), expired=int(bool(row)))
         return None
 
     def put_user(self, user_id: str, username: str, data: dict):
-        if not self.enabled or not self.conn:
+        self._put_users([(user_id, fold_username(username), self.codec.encode(data), time.time())])
+
+    def put_users(self, users: list[dict]):
+        """Store many API user objects as full profiles in one transaction."""
+        now = time.time()
+        self._put_users([(u["id"], fold_username(u["username"]), self.codec.encode({"data": u}), now) for u in users])
+
+    def _put_users(self, rows: list):
+        if not self.enabled or not self.conn or not rows:
             return
-        self.conn.execute(
-            "INSERT OR REPLACE INTO users (user_id, username, data, fetched_at) VALUES (?, ?, ?, ?)",
-            (user_id, username, json.dumps(data), time.time()),
-        )
-        self.conn.commit()
+        if self.memory is not None:
+            # A rename changes which handle maps to an ID; drop cached lookups for both.
+            self.memory.clear("users.username")
+            self._forget("users.user_id", (row[0] for row in rows))
+
+        def op(conn: sqlite3.Connection):
+            conn.executemany("DELETE FROM missing WHERE kind = 'user' AND key = ?", [(row[1],) for row in rows])
+            self._release_usernames(conn, rows)
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (user_id, username, data, fetched_at, partial, last_access, size)"
+                " VALUES (?1, ?2, ?3, ?4, 0, ?4, length(CAST(?3 AS BLOB)))",
+                rows,
+            )
+        self._write(op, "users")
+
+    # --- Negative entries ---
+    def get_missing(self, kind: str, keys: list[str]) -> dict[str, str]:
+        """Which of ``keys`` (tweet IDs for ``"tweet"``, handles for ``"user"``)
+        were reported missing within ``ttl_missing``, mapped to the API's reason."""
+        if not self.enabled or not self.conn or not keys:
+            return {}
+        started = time.perf_counter()
+        folded = {(fold_username(k) if kind == "user" else k): k for k in keys}
+        found = {}
+        chunk_keys = list(folded)
+        for i in range(0, len(chunk_keys), SQL_MAX_VARS):
+            chunk = chunk_keys[i:i + SQL_MAX_VARS]
+            for key, reason, fetched_at in self.conn.execute(
+                f"SELECT key, reason, fetched_at FROM missing WHERE kind = ? AND key IN ({','.join('?' * len(chunk))})",
+                (kind, *chunk),
+            ):
+                if self._is_fresh(fetched_at, self.ttl_missing):
+                    found[folded[key]] = reason
+        self._record_read("missing", started, hits=len(found), misses=len(folded) - len(found))
+        return found
+
+    def put_missing(self, kind: str, reasons: dict[str, str]):
+        """Remember that the API reported these tweets or users as missing."""
+        if not self.enabled or not self.conn or not reasons:
+            return
+        now = time.time()
+        rows = [(kind, fold_username(k) if kind == "user" else k, reason, now) for k, reason in reasons.items()]
+        self._write(lambda conn: conn.executemany(
+            "INSERT OR REPLACE INTO missing (kind, key, reason, fetched_at) VALUES (?, ?, ?, ?)", rows,
+        ), "missing")
 
     # --- Searches ---
-    def get_search(self, query: str, ttl: int) -> list[str] | None:
+    def get_search(
+        self, query: str, ttl: int, max_results: int | None = None, sort: str = "recency",
+    ) -> list[str] | None:
+        """Fresh cached result IDs of a search, in API order.
+
+        Queries are matched in canonical form (see ``canonical_query``) per
+        sort order. With ``max_results``, a larger cached result serves the
+        first ``max_results`` IDs; a smaller one only if it was complete.
+        """
+        if not self.enabled or not self.conn:
+            return None
+        started = time.perf_counter()
+        qh = self._search_hash(query, sort)
+        hit = self.memory.get("searches", qh, ttl) if self.memory is not None else None
+        if hit is None:
+            row = self.conn.execute(
+                "SELECT result_ids, fetched_at, last_access, complete FROM searches WHERE query_hash = ?", (qh,)
+            ).fetchone()
+            if not row or not self._is_fresh(row[1], ttl):
+                self._record_read("searches", started, misses=int(not row), expired=int(bool(row)))
+                return None
+            hit = (json.loads(row[0]), bool(row[3]))
+            self._remember("searches", qh, hit, row[1], len(row[0]))
+            if row[2] < time.time() - ACCESS_RESOLUTION:
+                self._touch("searches", [qh])
+        ids, complete = hit
+        if max_results is not None and len(ids) < max_results and not complete:
+            self._record_read("searches", started, misses=1)
+            return None
+        self._record_read("searches", started, hits=1)
+        return ids if max_results is None else ids[:max_results]
+
+    def get_search_cursor(self, query: str, sort: str = "recency") -> dict | None:
+        """A cached search regardless of age, with the cursor needed to refresh it.
+
+        Returns ``{"ids", "fetched_at", "newest_id", "oldest_id", "next_token", "complete"}``.
+        """
         if not self.enabled or not self.conn:
             return None
-        qh = self._query_hash(query)
         row = self.conn.execute(
-            "SELECT result_ids, fetched_at FROM searches WHERE query_hash = ?", (qh,)
+            "SELECT result_ids, fetched_at, newest_id, oldest_id, next_token, complete"
+            " FROM searches WHERE query_hash = ?",
+            (self._search_hash(query, sort),),
         ).fetchone()
-        if row and self._is_fresh(row[1], ttl):
-            return json.loads(row[0])
-        return None
+        if row is None:
+            return None
+        return {
+            "ids": json.loads(row[0]), "fetched_at": row[1],
+            "newest_id": row[2], "oldest_id": row[3], "next_token": row[4], "complete": bool(row[5]),
+        }
 
-    def put_search(self, query: str, result_ids: list[str]):
+    def put_search(
+        self, query: str, result_ids: list[str], next_token: str | None = None,
+        complete: bool = False, sort: str = "recency",
+    ):
+        """Store a search result; ``complete`` means it holds every match the API returned."""
         if not self.enabled or not self.conn:
             return
-        qh = self._query_hash(query)
-        self.conn.execute(
-            "INSERT OR REPLACE INTO searches (query_hash, query, result_ids, fetched_at) VALUES (?, ?, ?, ?)",
-            (qh, query, json.dumps(result_ids), time.time()),
+        newest = max(result_ids, key=int) if result_ids else None
+        oldest = min(result_ids, key=int) if result_ids else None
+        row = (
+            self._search_hash(query, sort), query, json.dumps(result_ids), time.time(),
+            newest, oldest, next_token, int(complete),
         )
-        self.conn.commit()
+        self._forget("searches", [row[0]])
+        self._write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO searches (query_hash, query, result_ids, fetched_at, last_access, size,"
+            " newest_id, oldest_id, next_token, complete)"
+            " VALUES (?1, ?2, ?3, ?4, ?4, length(CAST(?3 AS BLOB)), ?5, ?6, ?7, ?8)",
+            row,
+        ), "searches")
+
+    def search_local(self, query: str, limit: int = 20) -> list[str]:
+        """IDs of cached tweets matching ``query`` (X search syntax), newest first.
+
+        Raises ``QueryError`` for unsupported operators.
+        """
+        if not self.enabled or not self.conn:
+            return []
+        q = parse_query(query)
+        where, params = list(q.where), list(q.params)
+        if q.match:
+            where.append("i.tweet_id IN (SELECT rowid FROM tweets_fts WHERE tweets_fts MATCH ?)")
+            params.append(q.match)
+        if q.exclude:
+            where.append("i.tweet_id NOT IN (SELECT rowid FROM tweets_fts WHERE tweets_fts MATCH ?)")
+            params.append(q.exclude)
+        sql = "SELECT i.tweet_id FROM tweet_index i"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self.conn.execute(sql + " ORDER BY i.tweet_id DESC LIMIT ?", (*params, limit))
+        return [str(r[0]) for r in rows]
+
+    # --- Timelines ---
+    def get_timeline(self, user_id: str, ttl: int) -> dict | None:
+        """Indexed timeline of ``user_id``, newest first, regardless of age.
+
+        Returns ``{"ids", "newest_id", "oldest_id", "complete", "fresh"}``;
+        ``complete`` means the index reaches the oldest tweet the API serves.
+        """
+        if not self.enabled or not self.conn:
+            return None
+        started = time.perf_counter()
+        row = self.conn.execute(
+            "SELECT newest_id, oldest_id, complete, fetched_at FROM timelines WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            self._record_read("timelines", started, misses=1)
+            return None
+        ids = [str(r[0]) for r in self.conn.execute(
+            "SELECT tweet_id FROM timeline_tweets WHERE user_id = ? ORDER BY tweet_id DESC", (user_id,)
+        )]
+        fresh = self._is_fresh(row[3], ttl)
+        self._record_read("timelines", started, hits=int(fresh), expired=int(not fresh))
+        return {
+            "ids": ids,
+            "newest_id": str(row[0]) if row[0] is not None else None,
+            "oldest_id": str(row[1]) if row[1] is not None else None,
+            "complete": bool(row[2]),
+            "fresh": fresh,
+        }
+
+    def put_timeline(
+        self, user_id: str, tweet_ids: list[str], refreshed: bool = True,
+        complete: bool | None = None, reset: bool = False,
+    ):
+        """Add tweet IDs to a user's timeline index and move its watermarks.
+
+        ``refreshed`` marks the head as just checked; ``reset`` drops the
+        existing index first.
+        """
+        if not self.enabled or not self.conn:
+            return
+        rows = [(user_id, int(tid)) for tid in tweet_ids]
+        params = (user_id, None if complete is None else int(complete), time.time(), int(refreshed))
+
+        def op(conn: sqlite3.Connection):
+            if reset:
+                conn.execute("DELETE FROM timeline_tweets WHERE user_id = ?", (user_id,))
+                conn.execute("DELETE FROM timelines WHERE user_id = ?", (user_id,))
+            conn.executemany("INSERT OR IGNORE INTO timeline_tweets (user_id, tweet_id) VALUES (?, ?)", rows)
+            conn.execute("""
+                INSERT INTO timelines (user_id, newest_id, oldest_id, complete, fetched_at)
+                SELECT ?1, MAX(tweet_id), MIN(tweet_id), COALESCE(?2, 0), ?3 FROM timeline_tweets WHERE user_id = ?1
+                ON CONFLICT(user_id) DO UPDATE SET
+                    newest_id = excluded.newest_id, oldest_id = excluded.oldest_id,
+                    complete = COALESCE(?2, complete),
+                    fetched_at = CASE WHEN ?4 THEN excluded.fetched_at ELSE fetched_at END
+            """, params)
+        self._write(op, "timelines")
 
     # --- Counts ---
-    def get_counts(self, query: str, granularity: str, ttl: int) -> dict | None:
+    def get_count_series(self, query: str, granularity: str, ttl: int) -> dict | None:
+        """Every cached bucket of a counts series, oldest first, regardless of age.
+
+        Returns ``{"buckets": [{"start", "end", "count", "complete"}], "fresh"}``.
+        """
         if not self.enabled or not self.conn:
             return None
-        qh = self._query_hash(f"{query}:{granularity}")
+        started = time.perf_counter()
+        qh = self._query_hash(query)
         row = self.conn.execute(
-            "SELECT data, fetched_at FROM counts WHERE query_hash = ?", (qh,)
+            "SELECT fetched_at FROM count_series WHERE query_hash = ? AND granularity = ?", (qh, granularity)
         ).fetchone()
-        if row and self._is_fresh(row[1], ttl):
-            return json.loads(row[0])
-        return None
+        if row is None:
+            self._record_read("counts", started, misses=1)
+            return None
+        buckets = [
+            {"start": start, "end": end, "count": count, "complete": bool(complete)}
+            for start, end, count, complete in self.conn.execute(
+                "SELECT start, end, count, complete FROM count_buckets"
+                " WHERE query_hash = ? AND granularity = ? ORDER BY start", (qh, granularity),
+            )
+        ]
+        fresh = self._is_fresh(row[0], ttl)
+        self._record_read("counts", started, hits=int(fresh), expired=int(not fresh))
+        return {"buckets": buckets, "fresh": fresh}
+
+    def put_count_buckets(self, query: str, granularity: str, buckets: list[dict]):
+        """Merge ``{"start", "end", "count"}`` buckets into a series.
 
-    def put_counts(self, query: str, granularity: str, data: dict):
+        A bucket that has closed is never overwritten by a partial one.
+        """
         if not self.enabled or not self.conn:
             return
-        qh = self._query_hash(f"{query}:{granularity}")
-        self.conn.execute(
-            "INSERT OR REPLACE INTO counts (query_hash, query, granularity, data, fetched_at) VALUES (?, ?, ?, ?, ?)",
-            (qh, query, granularity, json.dumps(data), time.time()),
-        )
-        self.conn.commit()
+        now = time.time()
+        self._write(lambda conn: self._write_count_buckets(conn, query, granularity, buckets, now), "counts")
+
+    def _write_count_buckets(
+        self, conn: sqlite3.Connection, query: str, granularity: str, buckets: list[dict], fetched_at: float,
+    ):
+        qh = self._query_hash(query)
+        conn.execute("""
+            INSERT INTO count_series (query_hash, granularity, query, fetched_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(query_hash, granularity) DO UPDATE SET fetched_at = excluded.fetched_at
+        """, (qh, granularity, query, fetched_at))
+        conn.executemany("""
+            INSERT INTO count_buckets (query_hash, granularity, start, end, count, complete)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(query_hash, granularity, start) DO UPDATE SET
+                end = excluded.end, count = excluded.count, complete = excluded.complete
+            WHERE count_buckets.complete = 0 OR excluded.complete = 1
+        """, [
+            (qh, granularity, b["start"], b["end"], b["count"], int(bucket_complete(b, granularity, fetched_at)))
+            for b in buckets
+        ])
 
-    def cleanup(self, max_size_mb: int = 50):
-        """Remove old entries if cache exceeds max size."""
+    def size_bytes(self) -> int:
+        """Total payload bytes stored, from the ``usage`` accounting table."""
         if not self.enabled or not self.conn:
+            return 0
+        return self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM usage").fetchone()[0]
+
+    def db_bytes(self) -> int:
+        """Bytes of the database file in use: every table and index, excluding
+        free pages and the WAL."""
+        if not self.enabled or not self.conn:
+            return 0
+        pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * self.conn.execute("PRAGMA page_size").fetchone()[0]
+
+    def evict(self, max_bytes: int, time_budget: float | None = EVICT_TIME_SLICE) -> int:
+        """Delete least recently accessed rows until the database fits ``max_bytes``.
+
+        The limit applies to ``db_bytes()``, so the full-text and timeline
+        indexes, count buckets and negative entries count too. Expired
+        negative entries are purged first; then tweets, users and searches
+        go in LRU order, each tweet taking its index rows with it.
+
+        Works in batches of ``EVICT_BATCH`` and stops once the database is
+        below ``EVICT_TARGET`` of the limit or ``time_budget`` seconds have
+        passed, so a pass never stalls a command. Returns the number of rows
+        deleted.
+        """
+        if self.db_bytes() <= max_bytes:
+            return 0
+        self.flush()
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+        with self.conn:
+            self.conn.execute("DELETE FROM missing WHERE fetched_at < ?", (time.time() - self.ttl_missing,))
+        limit = int(max_bytes * EVICT_TARGET)
+        evicted = 0
+        while (used := self.db_bytes()) > limit:
+            # Space is only freed once whole pages empty, so aim the payload
+            # total at the file's current bytes-per-payload-byte ratio.
+            deleted = self._evict_payloads(self.size_bytes() * limit // used, deadline)
+            evicted += deleted
+            # FTS5 keeps deleted rows as tombstones until its segments merge.
+            with self.conn:
+                if deadline is None:
+                    self.conn.execute("INSERT INTO tweets_fts (tweets_fts) VALUES ('optimize')")
+                else:
+                    self.conn.execute("INSERT INTO tweets_fts (tweets_fts, rank) VALUES ('merge', ?)", (-VACUUM_PAGES,))
+            if not deleted or (deadline is not None and time.monotonic() > deadline):
+                break
+        if evicted:
+            if self.memory is not None:
+                self.memory.clear()
+            # Hand freed pages back to the filesystem a bounded chunk at a time.
+            pages = VACUUM_PAGES if time_budget is not None else self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+            self.conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+        return evicted
+
+    def _evict_payloads(self, target: int, deadline: float | None) -> int:
+        """Delete least recently accessed rows until payloads fit ``target`` bytes."""
+        evicted = 0
+        while (excess := self.size_bytes() - target) > 0:
+            candidates = []
+            for table, key in EVICTABLE.items():
+                candidates += [
+                    (last_access, table, k, size) for k, last_access, size in self.conn.execute(
+                        f"SELECT {key}, last_access, size FROM {table} ORDER BY last_access LIMIT ?", (EVICT_BATCH,)
+                    )
+                ]
+            if not candidates:
+                break
+            candidates.sort()
+            victims: dict[str, list] = {}
+            for _, table, k, size in candidates[:EVICT_BATCH]:
+                victims.setdefault(table, []).append(k)
+                excess -= size
+                evicted += 1
+                if excess <= 0:
+                    break
+            with self.conn:
+                for table, keys in victims.items():
+                    self.conn.execute(
+                        f"DELETE FROM {table} WHERE {EVICTABLE[table]} IN ({','.join('?' * len(keys))})", keys,
+                    )
+            if deadline is not None and time.monotonic() > deadline:
+                break
+        return evicted
+
+    def _maybe_evict(self):
+        if self.max_size_mb is not None and self.enabled and self.conn:
+            self.evict(int(self.max_size_mb * 1024 * 1024))
+
+    def _save_stats(self):
+        """Add this process's counters to ``cache_stats``."""
+        with self._stats_lock:
+            pending, self._stats = self._stats, defaultdict(Counter)
+        rows = [(table, *(c[f] for f in STAT_FIELDS)) for table, c in pending.items()]
+        if not rows:
             return
-        size = self.path.stat().st_size / (1024 * 1024) if self.path.exists() else 0
-        if size > max_size_mb:
-            for table in ("tweets", "searches", "users", "counts"):
-                self.conn.execute(f"""
-                    DELETE FROM {table} WHERE rowid IN (
-                        SELECT rowid FROM {table} ORDER BY fetched_at ASC
-                        LIMIT (SELECT COUNT(*) / 2 FROM {table})
+        try:
+            with self.conn:
+                self.conn.executemany(f"""
+                    INSERT INTO cache_stats (tbl, {', '.join(STAT_FIELDS)}) VALUES (?{', ?' * len(STAT_FIELDS)})
+                    ON CONFLICT(tbl) DO UPDATE SET {', '.join(f'{f} = {f} + excluded.{f}' for f in STAT_FIELDS)}
+                """, rows)
+        except sqlite3.Error as e:
+            print(f"Cache stats not saved: {e}", file=sys.stderr)
+
+    def stats(self) -> dict:
+        """Row counts, payload bytes, hit/miss/expired counters and mean
+        latencies per table, plus the file size on disk.
+
+        Includes this process's counters not yet saved by ``close()``.
+        """
+        if not self.enabled or not self.conn:
+            return {}
+        self.flush()
+        totals = {table: Counter() for table in STAT_TABLES}
+        for table, *values in self.conn.execute(f"SELECT tbl, {', '.join(STAT_FIELDS)} FROM cache_stats"):
+            totals.setdefault(table, Counter()).update(dict(zip(STAT_FIELDS, values)))
+        with self._stats_lock:
+            for table, c in self._stats.items():
+                totals.setdefault(table, Counter()).update(c)
+        sizes = {tbl: (rows, size) for tbl, rows, size in self.conn.execute("SELECT tbl, rows, bytes FROM usage")}
+        sizes["timelines"] = (self.conn.execute("SELECT COUNT(*) FROM timelines").fetchone()[0], None)
+        sizes["counts"] = (self.conn.execute("SELECT COUNT(*) FROM count_series").fetchone()[0], None)
+        sizes["missing"] = (self.conn.execute("SELECT COUNT(*) FROM missing").fetchone()[0], None)
+        tables = {}
+        for table, c in totals.items():
+            lookups = c["hits"] + c["misses"] + c["expired"]
+            rows, size = sizes.get(table, (0, None))
+            tables[table] = {
+                "rows": rows, "bytes": size,
+                "hits": c["hits"], "misses": c["misses"], "expired": c["expired"],
+                "hit_rate": c["hits"] / lookups if lookups else None,
+                "reads": c["reads"], "read_ms": 1000 * c["read_seconds"] / c["reads"] if c["reads"] else None,
+                "writes": c["writes"], "write_ms": 1000 * c["write_seconds"] / c["writes"] if c["writes"] else None,
+            }
+        files = [self.path, self.path.with_name(self.path.name + "-wal")]
+        return {
+            "tables": tables,
+            "payload_bytes": self.size_bytes(),
+            "file_bytes": sum(f.stat().st_size for f in files if f.exists()),
+        }
+
+    def cleanup(self, max_size_mb: float = 50):
+        """Evict least recently used entries until the cache fits ``max_size_mb``."""
+        if not self.enabled or not self.conn:
+            return
+        self.evict(int(max_size_mb * 1024 * 1024), time_budget=None)
+
+    def recompress(self, batch: int = 1000) -> tuple[int, int, int, int]:
+        """Re-encode rows not stored with the current codec.
+
+        Returns ``(rows rewritten, bytes before, bytes after, rows unreadable)``;
+        unreadable rows (see ``CodecError``) are deleted so they get refetched.
+        Freed pages are released to the filesystem afterwards.
+        """
+        if not self.enabled or not self.conn:
+            return 0, 0, 0, 0
+        self.flush()
+        tag = bytes([self.codec.tag])
+        rewritten = before = after = unreadable = 0
+        for table in ("tweets", "users"):
+            last = 0
+            while True:
+                rows = self.conn.execute(f"""
+                    SELECT rowid, data FROM {table}
+                    WHERE rowid > ? AND (typeof(data) != 'blob' OR substr(data, 1, 1) != ?)
+                    ORDER BY rowid LIMIT ?
+                """, (last, tag, batch)).fetchall()
+                if not rows:
+                    break
+                last = rows[-1][0]
+                updates, broken = [], []
+                for rowid, data in rows:
+                    try:
+                        updates.append((self.codec.encode(decode(data)), rowid))
+                    except CodecError:
+                        broken.append((rowid,))
+                        continue
+                    before += len(data.encode() if isinstance(data, str) else data)
+                after += sum(len(data) for data, _ in updates)
+                rewritten += len(updates)
+                unreadable += len(broken)
+                with self.conn:
+                    self.conn.executemany(
+                        f"UPDATE {table} SET data = ?1, size = length(?1) WHERE rowid = ?2", updates,
                     )
-                """)
-            self.conn.commit()
+                    self.conn.executemany(f"DELETE FROM {table} WHERE rowid = ?", broken)
+        if self.memory is not None:
+            self.memory.clear()
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            self.conn.execute("PRAGMA incremental_vacuum").fetchall()
+        else:
+            # Explicit maintenance: worth a full rebuild, which also enables incremental vacuum.
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
             self.conn.execute("VACUUM")
+        return rewritten, before, after, unreadable
+
+    # --- Snapshots ---
+    def export(self, dest: Path):
+        """Write a compact, consistent copy of the cache to ``dest``.
+
+        Uses the online backup API, so other processes can keep writing.
+        Entries are stored with the portable ``zlib`` codec so the snapshot
+        can be read on machines without the optional packages.
+        """
+        if not self.enabled or not self.conn:
+            raise RuntimeError("Cache is disabled")
+        self.flush()
+        dest = Path(dest)
+        tmp = dest.with_name(dest.name + ".tmp")
+        tmp.unlink(missing_ok=True)
+        snapshot = sqlite3.connect(str(tmp))
+        try:
+            self.conn.backup(snapshot)
+            snapshot.close()
+            with Cache(tmp, codec="zlib") as portable:
+                portable.recompress()
+            snapshot = sqlite3.connect(str(tmp))
+            snapshot.execute("PRAGMA journal_mode=DELETE")  # one self-contained file
+            snapshot.execute("VACUUM")
+        finally:
+            snapshot.close()
+        os.replace(tmp, dest)
+
+    def merge(self, src: Path) -> dict[str, int]:
+        """Merge a snapshot into this cache; for each entry the newest ``fetched_at`` wins.
+
+        Returns the number of rows taken from the snapshot per table, plus
+        ``unreadable``: entries skipped because they cannot be decoded here
+        (e.g. written with a codec whose package is not installed).
+        """
+        if not self.enabled or not self.conn:
+            raise RuntimeError("Cache is disabled")
+        self.flush()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # Work on a copy: older snapshots are migrated, and the original stays untouched.
+            copy = Path(tmpdir) / "snapshot.db"
+            shutil.copyfile(src, copy)
+            probe = sqlite3.connect(str(copy))
+            version = probe.execute("PRAGMA user_version").fetchone()[0]
+            probe.close()
+            current = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version > current:
+                raise ValueError(f"Snapshot schema v{version} is newer than this cache (v{current}); upgrade xr")
+            with Cache(copy, codec=self.codec.name) as snap:
+                unreadable = snap.recompress()[3]
+            self.conn.execute("ATTACH DATABASE ? AS snap", (str(copy),))
+            try:
+                with self.conn:
+                    merged = self._merge_attached()
+            finally:
+                self.conn.execute("DETACH DATABASE snap")
+        merged["unreadable"] = unreadable
+        if self.memory is not None:
+            self.memory.clear()
+        return merged
+
+    def _merge_attached(self) -> dict[str, int]:
+        c = self.conn
+        merged = {}
+        c.execute("""
+            CREATE TEMP TABLE merged_tweets AS
+            SELECT s.tweet_id FROM snap.tweets s LEFT JOIN main.tweets t ON t.tweet_id = s.tweet_id
+            WHERE t.tweet_id IS NULL OR s.fetched_at > t.fetched_at
+        """)
+        merged["tweets"] = c.execute("""
+            INSERT INTO main.tweets (tweet_id, data, fetched_at, author_id, last_access, size)
+            SELECT tweet_id, data, fetched_at, author_id, last_access, size FROM snap.tweets
+            WHERE tweet_id IN (SELECT tweet_id FROM temp.merged_tweets)
+            ON CONFLICT(tweet_id) DO UPDATE SET
+                data = excluded.data, fetched_at = excluded.fetched_at, author_id = excluded.author_id,
+                last_access = MAX(last_access, excluded.last_access), size = excluded.size
+        """).rowcount
+        for rows in iter(lambda: c.execute(
+            "SELECT tweet_id, data FROM main.tweets WHERE tweet_id IN"
+            " (SELECT tweet_id FROM temp.merged_tweets LIMIT 1000)"
+        ).fetchall(), []):
+            self._index_rows(rows)
+            c.executemany("DELETE FROM temp.merged_tweets WHERE tweet_id = ?", [(r[0],) for r in rows])
+        c.execute("DROP TABLE temp.merged_tweets")
+
+        # Users: a handle belongs to whichever side saw it last; partial
+        # records never replace full profiles.
+        c.execute("""
+            UPDATE main.users SET username = NULL WHERE username IS NOT NULL AND EXISTS (
+                SELECT 1 FROM snap.users s
+                WHERE s.username = main.users.username AND s.user_id != main.users.user_id
+                  AND s.fetched_at > main.users.fetched_at
+            )
+        """)
+        merged["users"] = c.execute("""
+            INSERT INTO main.users (user_id, username, data, fetched_at, partial, last_access, size)
+            SELECT s.user_id,
+                   CASE WHEN EXISTS (SELECT 1 FROM main.users u WHERE u.username = s.username AND u.user_id != s.user_id)
+                        THEN NULL ELSE s.username END,
+                   s.data, s.fetched_at, s.partial, s.last_access, s.size
+            FROM snap.users s WHERE true
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username, data = excluded.data, fetched_at = excluded.fetched_at,
+                partial = excluded.partial, last_access = MAX(last_access, excluded.last_access), size = excluded.size
+            WHERE excluded.fetched_at > users.fetched_at AND (excluded.partial = 0 OR users.partial = 1)
+        """).rowcount
+
+        merged["searches"] = c.execute("""
+            INSERT INTO main.searches
+                (query_hash, query, result_ids, fetched_at, last_access, size, newest_id, oldest_id, next_token, complete)
+            SELECT query_hash, query, result_ids, fetched_at, last_access, size, newest_id, oldest_id, next_token, complete
+            FROM snap.searches WHERE true
+            ON CONFLICT(query_hash) DO UPDATE SET
+                result_ids = excluded.result_ids, fetched_at = excluded.fetched_at,
+                last_access = MAX(last_access, excluded.last_access), size = excluded.size,
+                newest_id = excluded.newest_id, oldest_id = excluded.oldest_id, next_token = excluded.next_token,
+                complete = excluded.complete
+            WHERE excluded.fetched_at > searches.fetched_at
+        """).rowcount
+
+        # A timeline index is only contiguous as a whole: take the newer one entirely.
+        c.execute("""
+            CREATE TEMP TABLE merged_timelines AS
+            SELECT s.user_id FROM snap.timelines s LEFT JOIN main.timelines t ON t.user_id = s.user_id
+            WHERE t.user_id IS NULL OR s.fetched_at > t.fetched_at
+        """)
+        c.execute("DELETE FROM main.timeline_tweets WHERE user_id IN (SELECT user_id FROM temp.merged_timelines)")
+        c.execute("""
+            INSERT INTO main.timeline_tweets (user_id, tweet_id) SELECT user_id, tweet_id FROM snap.timeline_tweets
+            WHERE user_id IN (SELECT user_id FROM temp.merged_timelines)
+        """)
+        merged["timelines"] = c.execute("""
+            INSERT OR REPLACE INTO main.timelines (user_id, newest_id, oldest_id, complete, fetched_at)
+            SELECT user_id, newest_id, oldest_id, complete, fetched_at FROM snap.timelines
+            WHERE user_id IN (SELECT user_id FROM temp.merged_timelines)
+        """).rowcount
+        c.execute("DROP TABLE temp.merged_timelines")
+
+        # Count buckets: closed buckets win, otherwise keep what is here.
+        merged["count_buckets"] = c.execute("""
+            INSERT INTO main.count_buckets (query_hash, granularity, start, end, count, complete)
+            SELECT query_hash, granularity, start, end, count, complete FROM snap.count_buckets WHERE true
+            ON CONFLICT(query_hash, granularity, start) DO UPDATE SET
+                end = excluded.end, count = excluded.count, complete = excluded.complete
+            WHERE count_buckets.complete = 0 AND excluded.complete = 1
+        """).rowcount
+        c.execute("""
+            INSERT INTO main.count_series (query_hash, granularity, query, fetched_at)
+            SELECT query_hash, granularity, query, fetched_at FROM snap.count_series WHERE true
+            ON CONFLICT(query_hash, granularity) DO UPDATE SET fetched_at = MAX(fetched_at, excluded.fetched_at)
+        """)
+        return merged
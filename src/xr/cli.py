@@ -1,36 +1,84 @@
 """CLI entry point for XR."""
 from __future__ import annotations
 import json
+import sqlite3
+import subprocess
 import sys
 from pathlib import Path
 
 import click
 
 from xr import __version__
-from xr.auth import load_credentials, get_bearer_token, CredentialError
-from xr.api import XClient, APIError, RateLimitError
-from xr.cache import Cache
+from xr.auth import load_credentials, get_cached_bearer_token, CredentialError
+from xr.api import XClient, APIError, OfflineError, RateLimitError
+from xr.cache import Cache, get_codec
+from xr.ratelimit import RateLimiter
 from xr.config import Config
+from xr.models import SearchResult, Tweet
+from xr.query import QueryError
 from xr.formatters.markdown import (
     format_tweet, format_user, format_search, format_thread,
     format_timeline, format_followers, format_counts,
 )
 from xr.formatters.json_fmt import format_json
 
+def _open_cache(config: Config, **kwargs) -> Cache:
+    """Open the cache with the configured codec, reporting an unusable one
+    as a usage error rather than a traceback."""
+    try:
+        get_codec(config.cache_codec)
+    except ValueError as e:
+        raise click.ClickException(f"[cache] codec: {e}")
+    return Cache(codec=config.cache_codec, **kwargs)
+
 def _get_client_and_cache(ctx) -> tuple[XClient, Cache]:
     config = ctx.obj.get("config") or Config.load()
     ctx.obj["config"] = config
-    try:
-        key, secret = load_credentials()
-    except CredentialError as e:
-        click.echo(str(e), err=True)
-        raise SystemExit(1)
-    token = get_bearer_token(key, secret)
-    client = XClient(token)
+    offline = ctx.obj.get("offline", False)
+    if offline:
+        client = XClient(offline=True)
+    else:
+        try:
+            key, secret = load_credentials()
+        except CredentialError as e:
+            click.echo(str(e), err=True)
+            raise SystemExit(1)
+        # Token is resolved on the first API call, so cache-served commands
+        # never touch the network.
+        client = XClient(
+            pool_size=config.http_pool_size,
+            token_provider=lambda refresh: get_cached_bearer_token(key, secret, refresh=refresh),
+            limiter=RateLimiter(),
+        )
+    ctx.call_on_close(client.close)
     no_cache = ctx.obj.get("no_cache", False)
-    cache = Cache(enabled=config.cache_enabled and not no_cache)
+    cache = _open_cache(
+        config,
+        enabled=config.cache_enabled and not no_cache,
+        write_behind=config.cache_write_behind,
+        memory_entries=config.cache_memory_entries,
+        memory_bytes=config.cache_memory_max_mb * 1024 * 1024,
+        max_size_mb=config.cache_max_size_mb,
+        stale_ok=ctx.obj.get("stale_ok", False) or offline,
+        ttl_missing=config.cache_ttl_missing,
+    )
+    if ctx.obj.get("stale_ok") and not offline:
+        # Close callbacks run last-in first-out: this runs after cache.close has flushed.
+        ctx.call_on_close(lambda: cache.served_stale and _refresh_in_background(ctx))
+    ctx.call_on_close(cache.close)
     return client, cache
 
+def _refresh_in_background(ctx):
+    """Re-run this command in a detached process without --stale-ok, so
+    the expired entries it was served get refetched into the cache."""
+    argv = [a for a in sys.argv[1:] if a not in ("--stale-ok", "--save", "-")]
+    argv += ctx.obj.get("stdin_args", [])
+    subprocess.Popen(
+        [sys.executable, "-m", "xr", *argv],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
 def _output(ctx, content: str, filename: str | None = None):
     """Print to stdout and optionally save."""
     click.echo(content)
@@ -42,33 +90,67 @@ def _output(ctx, content: str, filename: str | None = None):
         path.write_text(content)
         click.echo(f"Saved: {path}", err=True)
 
-@click.group()
+class _Main(click.Group):
+    def invoke(self, ctx):
+        try:
+            return super().invoke(ctx)
+        except OfflineError as e:
+            raise click.ClickException(f"Not cached: {e.endpoint} (--offline)")
+        except APIError as e:
+            raise click.ClickException(str(e))
+
+@click.group(cls=_Main)
 @click.version_option(__version__, prog_name="xr")
 @click.option("--pretty", is_flag=True, help="Output raw JSON")
 @click.option("--save", is_flag=True, help="Save to configured directory")
 @click.option("--no-cache", is_flag=True, help="Bypass cache")
+@click.option("--stale-ok", is_flag=True, help="Serve expired cache entries and refresh them in the background")
+@click.option("--offline", is_flag=True, help="Serve only cached data; never call the API")
 @click.pass_context
-def main(ctx, pretty, save, no_cache):
+def main(ctx, pretty, save, no_cache, stale_ok, offline):
     """XR — X (Twitter) Research CLI."""
     ctx.ensure_object(dict)
     ctx.obj["pretty"] = pretty
     ctx.obj["save"] = save
     ctx.obj["no_cache"] = no_cache
+    ctx.obj["stale_ok"] = stale_ok
+    ctx.obj["offline"] = offline
+
+def _read_stdin_args() -> list[str]:
+    return sys.stdin.read().split()
 
 @main.command()
-@click.argument("input_str")
+@click.argument("inputs", nargs=-1)
 @click.pass_context
-def tweet(ctx, input_str):
-    """Fetch a single tweet by ID or URL."""
-    from xr.commands.tweet import fetch_tweet, extract_tweet_id
+def tweet(ctx, inputs):
+    """Fetch tweets by ID or URL (several allowed, or '-' to read stdin)."""
+    from xr.commands.tweet import (
+        fetch_tweet, fetch_tweets, extract_tweet_id, TWEET_FIELDS, USER_FIELDS, EXPANSIONS,
+    )
+    if inputs == ("-",):
+        inputs = _read_stdin_args()
+        ctx.obj["stdin_args"] = inputs
+    if not inputs:
+        raise click.UsageError("Provide at least one tweet ID or URL.")
+    tweet_ids = [extract_tweet_id(i) for i in inputs]
     client, cache = _get_client_and_cache(ctx)
     config = ctx.obj["config"]
-    tweet_id = extract_tweet_id(input_str)
+    if len(tweet_ids) > 1:
+        tweets = fetch_tweets(client, cache, tweet_ids, config.cache_ttl_tweets)
+        missing = set(tweet_ids) - {t.id for t in tweets}
+        if missing:
+            click.echo(f"Not found: {', '.join(sorted(missing))}", err=True)
+        if ctx.obj["pretty"]:
+            _output(ctx, format_json([{"id": t.id, "text": t.text, "username": t.username, "likes": t.likes} for t in tweets]))
+        else:
+            _output(ctx, "\n".join(format_tweet(t) for t in tweets), f"tweets-{len(tweets)}.md")
+        return
+    tweet_id = tweet_ids[0]
     if ctx.obj["pretty"]:
         data = client.get(f"tweets/{tweet_id}", {
-            "tweet.fields": "created_at,author_id,text,public_metrics,entities,referenced_tweets,note_tweet,conversation_id",
-            "expansions": "author_id,referenced_tweets.id",
-            "user.fields": "username,name,verified",
+            "tweet.fields": TWEET_FIELDS,
+            "expansions": EXPANSIONS,
+            "user.fields": USER_FIELDS,
         })
         _output(ctx, format_json(data), f"tweet-{tweet_id}.json")
     else:
@@ -124,14 +206,29 @@ def search(ctx, query, lang, no_rt, top, max_results):
         _output(ctx, md, f"search-{query[:50].replace(' ', '-')}.md")
 
 @main.command()
-@click.argument("username")
+@click.argument("usernames", nargs=-1)
 @click.pass_context
-def user(ctx, username):
-    """Fetch user profile."""
-    from xr.commands.user import fetch_user
+def user(ctx, usernames):
+    """Fetch user profiles (several allowed, or '-' to read stdin)."""
+    from xr.commands.user import fetch_user, fetch_users
+    if usernames == ("-",):
+        usernames = _read_stdin_args()
+        ctx.obj["stdin_args"] = usernames
+    if not usernames:
+        raise click.UsageError("Provide at least one username.")
     client, cache = _get_client_and_cache(ctx)
     config = ctx.obj["config"]
-    username = username.lstrip("@")
+    if len(usernames) > 1:
+        users = fetch_users(client, cache, list(usernames), config.cache_ttl_users)
+        missing = {n.lstrip("@").lower() for n in usernames} - {u.username.lower() for u in users}
+        if missing:
+            click.echo(f"Not found: {', '.join(sorted(missing))}", err=True)
+        if ctx.obj["pretty"]:
+            _output(ctx, format_json([{"id": u.id, "username": u.username, "name": u.name, "followers": u.followers, "following": u.following, "tweets": u.tweet_count} for u in users]))
+        else:
+            _output(ctx, "\n".join(format_user(u) for u in users), f"users-{len(users)}.md")
+        return
+    username = usernames[0].lstrip("@")
     u = fetch_user(client, cache, username, config.cache_ttl_users)
     if ctx.obj["pretty"]:
         _output(ctx, format_json({"id": u.id, "username": u.username, "name": u.name, "followers": u.followers, "following": u.following, "tweets": u.tweet_count}))
@@ -152,7 +249,10 @@ def timeline(ctx, username, top, no_rt, no_replies, max_results):
     client, cache = _get_client_and_cache(ctx)
     config = ctx.obj["config"]
     username = username.lstrip("@")
-    tweets, u = fetch_timeline(client, cache, username, max_results, no_rt, no_replies, top, config.cache_ttl_users, config.cache_ttl_tweets)
+    tweets, u = fetch_timeline(
+        client, cache, username, max_results, no_rt, no_replies, top,
+        config.cache_ttl_users, config.cache_ttl_tweets, config.cache_ttl_timelines,
+    )
     if ctx.obj["pretty"]:
         _output(ctx, format_json([{"id": t.id, "text": t.text, "likes": t.likes} for t in tweets]))
     else:
@@ -226,6 +326,102 @@ def counts(ctx, query, granularity):
         md = format_counts(result)
         _output(ctx, md, f"counts-{query[:50].replace(' ', '-')}.md")
 
+@main.group()
+def local():
+    """Query the local cache; never calls the API."""
+    pass
+
+@local.command("search")
+@click.argument("query")
+@click.option("--max", "max_results", default=20, help="Max results (default: 20)")
+@click.pass_context
+def local_search(ctx, query, max_results):
+    """Search every cached tweet (supports from:, lang:, is:, has:, since:, until:)."""
+    config = ctx.obj.get("config") or Config.load()
+    with _open_cache(config) as cache:
+        try:
+            ids = cache.search_local(query, max_results)
+        except QueryError as e:
+            raise click.UsageError(str(e))
+        # Local results are served regardless of age.
+        cached = cache.get_tweets(ids, ttl=float("inf"))
+    tweets = [Tweet.from_api(c.get("data", c), c.get("includes")) for c in cached.values()]
+    result = SearchResult(query=query, tweets=tweets, total=len(tweets))
+    if ctx.obj["pretty"]:
+        _output(ctx, format_json({"query": query, "total": result.total, "tweets": [{"id": t.id, "text": t.text, "username": t.username, "likes": t.likes} for t in result.tweets]}))
+    else:
+        _output(ctx, format_search(result, "recency"), f"local-search-{query[:50].replace(' ', '-')}.md")
+
+@main.group("cache")
+def cache_group():
+    """Maintain the local cache."""
+    pass
+
+@cache_group.command("recompress")
+@click.pass_context
+def cache_recompress(ctx):
+    """Re-encode cached payloads with the configured codec."""
+    config = ctx.obj.get("config") or Config.load()
+    with _open_cache(config) as cache:
+        rows, before, after, unreadable = cache.recompress()
+        click.echo(f"Recompressed {rows} entries with {cache.codec.name}: "
+                   f"{before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+        if unreadable:
+            click.echo(f"Removed {unreadable} entries that cannot be decoded here; they will be refetched", err=True)
+
+@cache_group.command("stats")
+@click.option("--json", "as_json", is_flag=True, help="Output JSON")
+@click.pass_context
+def cache_stats(ctx, as_json):
+    """Show hit rates, latency and size per cache table."""
+    with Cache() as cache:
+        stats = cache.stats()
+    if as_json or ctx.obj["pretty"]:
+        click.echo(format_json(stats))
+        return
+
+    def cell(value, width: int, spec: str = "") -> str:
+        return f"{'-' if value is None else format(value, spec):>{width}}"
+
+    click.echo(f"{'table':<10} {'rows':>8} {'MB':>7} {'hits':>8} {'misses':>8} {'expired':>8} "
+               f"{'hit rate':>8} {'read ms':>8} {'write ms':>8}")
+    for table, t in stats["tables"].items():
+        click.echo(
+            f"{table:<10} {t['rows']:>8} {cell(t['bytes'] and t['bytes'] / 1e6, 7, '.1f')} {t['hits']:>8} "
+            f"{t['misses']:>8} {t['expired']:>8} {cell(t['hit_rate'], 8, '.0%')} "
+            f"{cell(t['read_ms'], 8, '.2f')} {cell(t['write_ms'], 8, '.2f')}"
+        )
+    click.echo(f"\nPayloads {stats['payload_bytes'] / 1e6:.1f} MB, file {stats['file_bytes'] / 1e6:.1f} MB")
+
+@cache_group.command("export")
+@click.argument("path", type=click.Path(dir_okay=False, path_type=Path))
+@click.pass_context
+def cache_export(ctx, path):
+    """Write a compact snapshot of the cache to PATH."""
+    config = ctx.obj.get("config") or Config.load()
+    with _open_cache(config) as cache:
+        cache.export(path)
+    click.echo(f"Exported cache to {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+@cache_group.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.pass_context
+def cache_import(ctx, path):
+    """Merge a snapshot into the cache; newer entries win."""
+    config = ctx.obj.get("config") or Config.load()
+    cache = _open_cache(config)
+    try:
+        with cache:
+            merged = cache.merge(path)
+    except (ValueError, sqlite3.DatabaseError) as e:
+        raise click.ClickException(f"Cannot import {path}: {e}")
+    unreadable = merged.pop("unreadable")
+    click.echo("Merged " + ", ".join(f"{n} {table}" for table, n in merged.items()))
+    if unreadable:
+        click.echo(f"Skipped {unreadable} entries that cannot be decoded here", err=True)
+
+cache_group.add_command(cache_import, "merge")
+
 @main.group()
 def auth():
     """Manage API credentials."""
@@ -251,8 +447,7 @@ def auth_setup():
 
     # Test connection
     try:
-        from xr.auth import get_bearer_token
-        get_bearer_token(key, secret)
+        get_cached_bearer_token(key, secret, refresh=True)
         click.echo("Connection test: OK")
     except Exception as e:
         click.echo(f"Connection test failed: {e}", err=True)
@@ -1,33 +1,45 @@
 """Fetch tweet volume counts."""
 from __future__ import annotations
+import time
 
 from xr.api import XClient
-from xr.cache import Cache
+from xr.cache import Cache, parse_time
 from xr.models import CountBucket, CountResult
 
+# tweets/counts/recent only accepts a start_time within the last 7 days.
+RECENT_WINDOW = 7 * 86400 - 300
+
 def fetch_counts(
     client: XClient, cache: Cache, query: str,
     granularity: str = "day", ttl: int = 3600,
 ) -> CountResult:
-    cached = cache.get_counts(query, granularity, ttl)
-    if cached:
-        buckets = [CountBucket(**b) for b in cached.get("buckets", [])]
-        return CountResult(query=query, granularity=granularity, buckets=buckets, total=cached.get("total", 0))
-
-    data = client.get("tweets/counts/recent", {
-        "query": query,
-        "granularity": granularity,
-    })
-
-    buckets = [
-        CountBucket(start=b["start"], end=b["end"], count=b["tweet_count"])
-        for b in data.get("data", [])
-    ]
-    total = data.get("meta", {}).get("total_tweet_count", sum(b.count for b in buckets))
-
-    cache.put_counts(query, granularity, {
-        "buckets": [{"start": b.start, "end": b.end, "count": b.count} for b in buckets],
-        "total": total,
-    })
-
-    return CountResult(query=query, granularity=granularity, buckets=buckets, total=total)
+    """Volume series for ``query``, including history older than the API's window.
+
+    Buckets are cached one row each. Once the series expires, only buckets
+    from the end of the last closed one onwards are requested and merged in.
+    """
+    series = cache.get_count_series(query, granularity, ttl)
+    cached = series["buckets"] if series else []
+    if series and series["fresh"]:
+        return _result(query, granularity, cached)
+
+    params = {"query": query, "granularity": granularity}
+    closed = [b for b in cached if b["complete"]]
+    if closed and time.time() - parse_time(closed[-1]["end"]) < RECENT_WINDOW:
+        params["start_time"] = closed[-1]["end"]
+
+    data = client.get("tweets/counts/recent", params)
+    fetched = [{"start": b["start"], "end": b["end"], "count": b["tweet_count"]} for b in data.get("data", [])]
+    # A full refetch starts with a partial bucket inside one we already
+    # closed; keep the closed one so the series is not counted twice.
+    spans = [(parse_time(b["start"]), parse_time(b["end"])) for b in closed]
+    fetched = [b for b in fetched if not any(start <= parse_time(b["start"]) < end for start, end in spans)]
+    cache.put_count_buckets(query, granularity, fetched)
+
+    merged = {b["start"]: b for b in cached}
+    merged.update((b["start"], b) for b in fetched)
+    return _result(query, granularity, [merged[start] for start in sorted(merged)])
+
+def _result(query: str, granularity: str, buckets: list[dict]) -> CountResult:
+    buckets = [CountBucket(start=b["start"], end=b["end"], count=b["count"]) for b in buckets]
+    return CountResult(query=query, granularity=granularity, buckets=buckets, total=sum(b.count for b in buckets))
@@ -1,7 +1,7 @@
 """Fetch followers and following lists."""
 from __future__ import annotations
 
-from xr.api import XClient
+from xr.api import XClient, paginate
 from xr.cache import Cache
 from xr.models import User
 from xr.commands.user import fetch_user, USER_FIELDS
@@ -12,14 +12,15 @@ def fetch_followers(
 ) -> tuple[list[User], User]:
     target = fetch_user(client, cache, username, ttl_user)
 
-    data = client.get(f"users/{target.id}/followers", {
-        "user.fields": USER_FIELDS,
-        "max_results": min(max_results, 1000),
-    })
-
-    users = [User.from_api(u) for u in data.get("data", [])]
-    for u in users:
-        cache.put_user(u.id, u.username, {"data": data})
+    users = []
+    pages = paginate(
+        client, f"users/{target.id}/followers", {"user.fields": USER_FIELDS},
+        max_results, page_size=1000,
+    )
+    for page in pages:
+        batch = page.get("data", [])[:max_results - len(users)]
+        users.extend(User.from_api(u) for u in batch)
+        cache.put_users(batch)
 
     return users, target
 
@@ -29,10 +30,14 @@ def fetch_following(
 ) -> tuple[list[User], User]:
     target = fetch_user(client, cache, username, ttl_user)
 
-    data = client.get(f"users/{target.id}/following", {
-        "user.fields": USER_FIELDS,
-        "max_results": min(max_results, 1000),
-    })
+    users = []
+    pages = paginate(
+        client, f"users/{target.id}/following", {"user.fields": USER_FIELDS},
+        max_results, page_size=1000,
+    )
+    for page in pages:
+        batch = page.get("data", [])[:max_results - len(users)]
+        users.extend(User.from_api(u) for u in batch)
+        cache.put_users(batch)
 
-    users = [User.from_api(u) for u in data.get("data", [])]
     return users, target
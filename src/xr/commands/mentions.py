@@ -1,7 +1,7 @@
 """Fetch user's mentions."""
 from __future__ import annotations
 
-from xr.api import XClient
+from xr.api import XClient, paginate
 from xr.cache import Cache
 from xr.models import Tweet, User
 from xr.commands.user import fetch_user
@@ -13,18 +13,17 @@ def fetch_mentions(
 ) -> tuple[list[Tweet], User]:
     user = fetch_user(client, cache, username, ttl_user)
 
-    data = client.get(f"users/{user.id}/mentions", {
+    params = {
         "tweet.fields": TWEET_FIELDS,
         "expansions": "author_id",
         "user.fields": TWEET_USER_FIELDS,
-        "max_results": min(max_results, 100),
-    })
-    includes = data.get("includes", {})
+    }
 
     tweets = []
-    for t in data.get("data", []):
-        tweet = Tweet.from_api(t, includes)
-        tweets.append(tweet)
-        cache.put_tweet(tweet.id, {"data": t, "includes": includes})
+    for page in paginate(client, f"users/{user.id}/mentions", params, max_results, min_page_size=5):
+        includes = page.get("includes", {})
+        batch = page.get("data", [])[:max_results - len(tweets)]
+        tweets.extend(Tweet.parse_page(page, len(batch)))
+        cache.put_tweets((t["id"], {"data": t, "includes": includes}) for t in batch)
 
     return tweets, user
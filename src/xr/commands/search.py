@@ -1,57 +1,94 @@
 """Search recent tweets."""
 from __future__ import annotations
+import time
 
-from xr.api import XClient
+from xr.api import XClient, paginate
 from xr.cache import Cache
 from xr.models import Tweet, SearchResult
 from xr.commands.tweet import TWEET_FIELDS, USER_FIELDS
 
+# search/recent only accepts a since_id from the last 7 days.
+SINCE_ID_MAX_AGE = 7 * 86400 - 3600
+TWITTER_EPOCH_MS = 1288834974657
+
+def _snowflake_time(tweet_id: str) -> float:
+    """Creation time encoded in a tweet ID, in seconds since the epoch."""
+    return ((int(tweet_id) >> 22) + TWITTER_EPOCH_MS) / 1000
+
 def fetch_search(
     client: XClient, cache: Cache, query: str,
     max_results: int = 20, sort: str = "recency",
     ttl_search: int = 3600, ttl_tweet: int = 604800,
 ) -> SearchResult:
-    # Check search cache
-    cached_ids = cache.get_search(query, ttl_search)
+    # Check search cache; a larger or complete cached result also serves this request
+    cached_ids = cache.get_search(query, ttl_search, max_results, sort)
     if cached_ids is not None:
-        tweets = []
-        for tid in cached_ids:
-            cached_tweet = cache.get_tweet(tid, ttl_tweet)
-            if cached_tweet:
-                tweets.append(Tweet.from_api(
-                    cached_tweet.get("data", cached_tweet),
-                    cached_tweet.get("includes"),
-                ))
-        if len(tweets) == len(cached_ids):
-            return SearchResult(query=query, tweets=tweets, total=len(tweets))
-
-    # Fresh fetch
+        cached = cache.get_tweets(cached_ids, ttl_tweet)
+        if len(cached) == len(set(cached_ids)):
+            tweets = [Tweet.from_api(c.get("data", c), c.get("includes")) for c in cached.values()]
+            return _result(query, tweets)
+
     params = {
         "query": query,
         "tweet.fields": TWEET_FIELDS,
         "expansions": "author_id",
         "user.fields": USER_FIELDS,
-        "max_results": max(min(max_results, 100), 10),
     }
     if sort == "relevancy":
         params["sort_order"] = "relevancy"
 
-    data = client.get("tweets/search/recent", params)
+    # An expired recency search only needs the tweets posted since its
+    # newest result, merged in front of the cached window.
+    previous = []
+    cursor = cache.get_search_cursor(query) if sort != "relevancy" else None
+    if (
+        cursor and cursor["newest_id"]
+        and (len(cursor["ids"]) >= max_results or cursor["complete"])
+        and time.time() - _snowflake_time(cursor["newest_id"]) < SINCE_ID_MAX_AGE
+    ):
+        cached = cache.get_tweets(cursor["ids"], ttl_tweet)
+        if len(cached) == len(set(cursor["ids"])):
+            previous = [Tweet.from_api(c.get("data", c), c.get("includes")) for c in cached.values()]
+            params["since_id"] = cursor["newest_id"]
 
-    includes = data.get("includes", {})
     tweets = []
-    tweet_ids = []
-    for t in data.get("data", []):
-        tweet = Tweet.from_api(t, includes)
-        tweets.append(tweet)
-        tweet_ids.append(tweet.id)
-        cache.put_tweet(tweet.id, {"data": t, "includes": includes})
+    next_token = None
+    complete = True  # every match the API has is in ``tweets``
+    pages = paginate(
+        client, "tweets/search/recent", params, max_results,
+        min_page_size=10, token_param="next_token",
+    )
+    for page in pages:
+        next_token = page.get("meta", {}).get("next_token")
+        includes = page.get("includes", {})
+        data = page.get("data", [])
+        batch = data[:max_results - len(tweets)]
+        complete = next_token is None and len(batch) == len(data)
+        tweets.extend(Tweet.parse_page(page, len(batch)))
+        cache.put_tweets((t["id"], {"data": t, "includes": includes}) for t in batch)
+
+    stored = tweets
+    if "since_id" in params and complete:
+        # Everything since the cached head was fetched, so the old window
+        # continues it. Keep as much of it as the larger of the two requests
+        # asked for: a smaller --max must not shrink the cached result.
+        seen = {t.id for t in tweets}
+        older = [t for t in previous if t.id not in seen]
+        stored = (tweets + older)[:max(len(cursor["ids"]), max_results)]
+        # A page token only continues the old window if none of it was trimmed.
+        untrimmed = len(stored) - len(tweets) == len(older)
+        next_token = cursor["next_token"] if untrimmed else None
+        complete = cursor["complete"] and untrimmed
+        tweets = stored[:max_results]
 
-    cache.put_search(query, tweet_ids)
-    meta = data.get("meta", {})
+    cache.put_search(query, [t.id for t in stored], next_token, complete, sort)
+    return _result(query, tweets, next_token if len(tweets) == len(stored) else None)
 
+def _result(query: str, tweets: list[Tweet], next_token: str | None = None) -> SearchResult:
+    ids = [t.id for t in tweets]
     return SearchResult(
-        query=query, tweets=tweets, total=meta.get("result_count", len(tweets)),
-        newest_id=meta.get("newest_id"), oldest_id=meta.get("oldest_id"),
-        next_token=meta.get("next_token"),
+        query=query, tweets=tweets, total=len(tweets),
+        newest_id=max(ids, key=int) if ids else None,
+        oldest_id=min(ids, key=int) if ids else None,
+        next_token=next_token,
     )
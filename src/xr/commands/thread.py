@@ -15,22 +15,31 @@ def fetch_thread(
     initial = fetch_tweet(client, cache, tweet_id, ttl_tweet)
     conversation_id = initial.conversation_id or tweet_id
 
-    # Search conversation
-    data = client.get("tweets/search/recent", {
-        "query": f"conversation_id:{conversation_id}",
-        "tweet.fields": TWEET_FIELDS,
-        "expansions": "author_id",
-        "user.fields": USER_FIELDS,
-        "max_results": 100,
-        "sort_order": "recency",
-    })
-
-    includes = data.get("includes", {})
-    all_tweets = [initial]
-    for t in data.get("data", []):
-        tweet = Tweet.from_api(t, includes)
-        cache.put_tweet(tweet.id, {"data": t, "includes": includes})
-        all_tweets.append(tweet)
+    # Search conversation, reusing a fresh cached result if every tweet is cached
+    query = f"conversation_id:{conversation_id}"
+    replies = None
+    cached_ids = cache.get_search(query, ttl_search, max_results=100)
+    if cached_ids is not None:
+        cached = cache.get_tweets(cached_ids, ttl_tweet)
+        if len(cached) == len(set(cached_ids)):
+            replies = [Tweet.from_api(c.get("data", c), c.get("includes")) for c in cached.values()]
+
+    if replies is None:
+        data = client.get("tweets/search/recent", {
+            "query": query,
+            "tweet.fields": TWEET_FIELDS,
+            "expansions": "author_id",
+            "user.fields": USER_FIELDS,
+            "max_results": 100,
+            "sort_order": "recency",
+        })
+        includes = data.get("includes", {})
+        page = data.get("data", [])
+        replies = Tweet.parse_page(data)
+        cache.put_tweets((t["id"], {"data": t, "includes": includes}) for t in page)
+        cache.put_search(query, [t["id"] for t in page], complete="next_token" not in data.get("meta", {}))
+
+    all_tweets = [initial] + replies
 
     # Deduplicate
     seen = set()
@@ -1,43 +1,94 @@
 """Fetch user's tweet timeline."""
 from __future__ import annotations
 
-from xr.api import XClient
+from xr.api import OfflineError, XClient, paginate
 from xr.cache import Cache
 from xr.models import Tweet, User
 from xr.commands.user import fetch_user
-from xr.commands.tweet import TWEET_FIELDS, USER_FIELDS as TWEET_USER_FIELDS
+from xr.commands.tweet import TWEET_FIELDS, USER_FIELDS as TWEET_USER_FIELDS, fetch_tweets
+
+HEAD_LIMIT = 100  # new tweets fetched to bridge the gap to the cached head
 
 def fetch_timeline(
     client: XClient, cache: Cache, username: str,
     max_results: int = 20, no_retweets: bool = False,
     no_replies: bool = False, sort_by_likes: bool = False,
-    ttl_user: int = 86400, ttl_tweet: int = 604800,
+    ttl_user: int = 86400, ttl_tweet: int = 604800, ttl_timeline: int = 900,
 ) -> tuple[list[Tweet], User]:
-    user = fetch_user(client, cache, username, ttl_user)
-
-    exclude = []
-    if no_retweets:
-        exclude.append("retweets")
-    if no_replies:
-        exclude.append("replies")
+    """Recent tweets of ``username``, served from the cached timeline index.
 
+    The index keeps every tweet ID seen for the user, retweets and replies
+    included, and filters them locally. Once ``ttl_timeline`` has passed only
+    tweets newer than the index head are requested (``since_id``); older
+    tweets are backfilled (``until_id``) only when the window needs them.
+    """
+    user = fetch_user(client, cache, username, ttl_user)
     params = {
         "tweet.fields": TWEET_FIELDS,
         "expansions": "author_id",
         "user.fields": TWEET_USER_FIELDS,
-        "max_results": min(max_results, 100),
     }
-    if exclude:
-        params["exclude"] = ",".join(exclude)
+    loaded: dict[str, Tweet] = {}
+
+    def fetch_pages(extra: dict, limit: int) -> tuple[list[str], bool]:
+        """Fetch up to ``limit`` tweets; also report whether the timeline ran out."""
+        ids, exhausted = [], True
+        for page in paginate(client, f"users/{user.id}/tweets", {**params, **extra}, limit, min_page_size=5):
+            includes = page.get("includes", {})
+            batch = page.get("data", [])[:limit - len(ids)]
+            for t in Tweet.parse_page(page, len(batch)):
+                loaded[t.id] = t
+                ids.append(t.id)
+            cache.put_tweets((t["id"], {"data": t, "includes": includes}) for t in batch)
+            exhausted = not page.get("meta", {}).get("next_token")
+        return ids, exhausted
+
+    state = cache.get_timeline(user.id, ttl_timeline)
+    ids, complete = (state["ids"], state["complete"]) if state else ([], False)
+    if state is None or not state["fresh"]:
+        if ids:
+            head, caught_up = fetch_pages({"since_id": state["newest_id"]}, max(max_results, HEAD_LIMIT))
+            if caught_up:
+                cache.put_timeline(user.id, head)
+                seen = set(head)
+                ids = head + [i for i in ids if i not in seen]
+            else:
+                # Too many new tweets to bridge cheaply: start a new index
+                # rather than keep one with a hole in it.
+                cache.put_timeline(user.id, head, reset=True)
+                ids, complete = head, False
+        else:
+            ids, complete = fetch_pages({}, max_results)
+            cache.put_timeline(user.id, ids, complete=complete)
 
-    data = client.get(f"users/{user.id}/tweets", params)
-    includes = data.get("includes", {})
+    def wanted(t: Tweet) -> bool:
+        return not (no_retweets and t.is_retweet or no_replies and t.is_reply)
 
-    tweets = []
-    for t in data.get("data", []):
-        tweet = Tweet.from_api(t, includes)
-        tweets.append(tweet)
-        cache.put_tweet(tweet.id, {"data": t, "includes": includes})
+    tweets: list[Tweet] = []
+    pos = 0
+    while len(tweets) < max_results:
+        needed = max_results - len(tweets)
+        if pos >= len(ids):
+            if complete or not ids:
+                break
+            # Filters drop an unknown share of each page, so ask for full
+            # pages rather than only the count still missing.
+            limit = HEAD_LIMIT if no_retweets or no_replies else needed
+            try:
+                older, complete = fetch_pages({"until_id": min(ids, key=int)}, limit)
+            except OfflineError:
+                break  # serve what the index has
+            cache.put_timeline(user.id, older, refreshed=False, complete=complete or not older)
+            if not older:
+                break
+            ids += older
+            continue
+        chunk = ids[pos:pos + needed]
+        pos += len(chunk)
+        missing = [tid for tid in chunk if tid not in loaded]
+        if missing:
+            loaded.update((t.id, t) for t in fetch_tweets(client, cache, missing, ttl_tweet))
+        tweets.extend(loaded[tid] for tid in chunk if tid in loaded and wanted(loaded[tid]))
 
     if sort_by_likes:
         tweets.sort(key=lambda t: t.likes, reverse=True)
@@ -1,15 +1,17 @@
-"""Fetch a single tweet."""
+"""Fetch tweets by ID."""
 from __future__ import annotations
 import re
 
 import click
 
-from xr.api import XClient
+from xr.api import NotFoundError, OfflineError, XClient, not_found
 from xr.cache import Cache
 from xr.models import Tweet
 
-TWEET_FIELDS = "created_at,author_id,text,public_metrics,entities,referenced_tweets,note_tweet,conversation_id"
+TWEET_FIELDS = "created_at,author_id,text,public_metrics,entities,referenced_tweets,note_tweet,conversation_id,lang"
 USER_FIELDS = "username,name,verified"
+EXPANSIONS = "author_id,referenced_tweets.id,referenced_tweets.id.author_id"
+LOOKUP_BATCH = 100  # max ids per GET /2/tweets
 
 URL_PATTERN = re.compile(r'(?:x\.com|twitter\.com)/\w+/status/(\d+)')
 
@@ -25,11 +27,57 @@ def fetch_tweet(client: XClient, cache: Cache, tweet_id: str, ttl: int) -> Tweet
     cached = cache.get_tweet(tweet_id, ttl)
     if cached:
         return Tweet.from_api(cached.get("data", cached), cached.get("includes"))
+    endpoint = f"tweets/{tweet_id}"
+    if reason := cache.get_missing("tweet", [tweet_id]).get(tweet_id):
+        raise NotFoundError(endpoint, reason)
 
-    data = client.get(f"tweets/{tweet_id}", {
-        "tweet.fields": TWEET_FIELDS,
-        "expansions": "author_id,referenced_tweets.id",
-        "user.fields": USER_FIELDS,
-    })
+    try:
+        data = client.get(endpoint, {
+            "tweet.fields": TWEET_FIELDS,
+            "expansions": EXPANSIONS,
+            "user.fields": USER_FIELDS,
+        })
+    except NotFoundError as e:
+        cache.put_missing("tweet", {tweet_id: e.detail})
+        raise
+    if "data" not in data:
+        reason = not_found(data, "tweet").get(tweet_id, f"Could not find tweet with id: [{tweet_id}].")
+        cache.put_missing("tweet", {tweet_id: reason})
+        raise NotFoundError(endpoint, reason)
     cache.put_tweet(tweet_id, data)
     return Tweet.from_api(data["data"], data.get("includes"))
+
+def fetch_tweets(client: XClient, cache: Cache, tweet_ids: list[str], ttl: int) -> list[Tweet]:
+    """Hydrate many tweets, in input order.
+
+    The cache is checked in one query; only misses hit the API, batched
+    through the multi-ID lookup endpoint. IDs the API does not return
+    (deleted, protected) are left out, and remembered as missing; offline,
+    uncached IDs are left out too.
+    """
+    ids = list(dict.fromkeys(tweet_ids))
+    found = {
+        tid: Tweet.from_api(c.get("data", c), c.get("includes"))
+        for tid, c in cache.get_tweets(ids, ttl).items()
+    }
+    misses = [tid for tid in ids if tid not in found]
+    gone = cache.get_missing("tweet", misses)
+    misses = [tid for tid in misses if tid not in gone]
+    for i in range(0, len(misses), LOOKUP_BATCH):
+        chunk = misses[i:i + LOOKUP_BATCH]
+        try:
+            data = client.get("tweets", {
+                "ids": ",".join(chunk),
+                "tweet.fields": TWEET_FIELDS,
+                "expansions": EXPANSIONS,
+                "user.fields": USER_FIELDS,
+            })
+        except OfflineError:
+            break  # serve only what is cached
+        includes = data.get("includes", {})
+        batch = data.get("data", [])
+        found.update((t.id, t) for t in Tweet.parse_page(data))
+        cache.put_tweets((t["id"], {"data": t, "includes": includes}) for t in batch)
+        reported = not_found(data, "tweet")
+        cache.put_missing("tweet", {tid: reported[tid] for tid in chunk if tid in reported})
+    return [found[tid] for tid in ids if tid in found]
@@ -1,19 +1,73 @@
 """Fetch user profile."""
 from __future__ import annotations
 
-from xr.api import XClient
+from xr.api import NotFoundError, OfflineError, XClient, not_found
 from xr.cache import Cache
 from xr.models import User
 
 USER_FIELDS = "created_at,description,public_metrics,verified,profile_image_url,url,pinned_tweet_id"
+LOOKUP_BATCH = 100  # max usernames per GET /2/users/by
 
 def fetch_user(client: XClient, cache: Cache, username: str, ttl: int = 86400) -> User:
     cached = cache.get_user(username, ttl)
     if cached:
         return User.from_api(cached.get("data", cached))
+    endpoint = f"users/by/username/{username}"
+    if reason := cache.get_missing("user", [username]).get(username):
+        raise NotFoundError(endpoint, reason)
 
-    data = client.get(f"users/by/username/{username}", {
-        "user.fields": USER_FIELDS,
-    })
-    cache.put_user(data["data"]["id"], username, data)
+    try:
+        data = client.get(endpoint, {
+            "user.fields": USER_FIELDS,
+        })
+    except NotFoundError as e:
+        cache.put_missing("user", {username: e.detail})
+        raise
+    if "data" not in data:
+        reported = {k.lower(): v for k, v in not_found(data, "user").items()}
+        reason = reported.get(username.lower(), f"Could not find user with username: [{username}].")
+        cache.put_missing("user", {username: reason})
+        raise NotFoundError(endpoint, reason)
+    cache.put_user(data["data"]["id"], data["data"].get("username", username), data)
     return User.from_api(data["data"])
+
+def fetch_users(client: XClient, cache: Cache, usernames: list[str], ttl: int = 86400) -> list[User]:
+    """Resolve many usernames, in input order.
+
+    Cached profiles are served from the cache; the rest are looked up 100
+    at a time. Usernames the API does not return are left out, and
+    remembered as missing; offline, uncached usernames are left out too.
+    """
+    requested = {}
+    for name in usernames:
+        name = name.lstrip("@")
+        requested.setdefault(name.lower(), name)
+
+    found = {}
+    misses = []
+    for key, name in requested.items():
+        cached = cache.get_user(name, ttl)
+        if cached:
+            found[key] = User.from_api(cached.get("data", cached))
+        else:
+            misses.append(name)
+    gone = cache.get_missing("user", misses)
+    misses = [name for name in misses if name not in gone]
+
+    for i in range(0, len(misses), LOOKUP_BATCH):
+        chunk = misses[i:i + LOOKUP_BATCH]
+        try:
+            data = client.get("users/by", {
+                "usernames": ",".join(chunk),
+                "user.fields": USER_FIELDS,
+            })
+        except OfflineError:
+            break  # serve only what is cached
+        batch = data.get("data", [])
+        for u in batch:
+            found[u["username"].lower()] = User.from_api(u)
+        cache.put_users(batch)
+        reported = {k.lower(): v for k, v in not_found(data, "user").items()}
+        cache.put_missing("user", {name: reported[name.lower()] for name in chunk if name.lower() in reported})
+
+    return [found[key] for key in requested if key in found]
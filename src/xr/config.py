@@ -16,12 +16,21 @@ DEFAULT_CONFIG = {
         "ttl_users": 86400,
         "ttl_searches": 3600,
         "ttl_counts": 3600,
+        "ttl_timelines": 900,
+        "ttl_missing": 86400,
         "max_size_mb": 50,
+        "write_behind": False,
+        "memory_entries": 1024,
+        "memory_max_mb": 16,
+        "codec": "auto",
     },
     "search": {
         "default_lang": "",
         "default_max": 20,
     },
+    "http": {
+        "pool_size": 10,
+    },
 }
 
 def _config_path() -> Path:
@@ -37,9 +46,16 @@ class Config:
     cache_ttl_users: int = 86400
     cache_ttl_searches: int = 3600
     cache_ttl_counts: int = 3600
+    cache_ttl_timelines: int = 900
+    cache_ttl_missing: int = 86400
     cache_max_size_mb: int = 50
+    cache_write_behind: bool = False
+    cache_memory_entries: int = 1024
+    cache_memory_max_mb: int = 16
+    cache_codec: str = "auto"
     search_default_lang: str = ""
     search_default_max: int = 20
+    http_pool_size: int = 10
 
     def __post_init__(self):
         # Env var overrides
@@ -57,6 +73,7 @@ class Config:
             output = data.get("output", {})
             cache = data.get("cache", {})
             search = data.get("search", {})
+            http = data.get("http", {})
             if "save_dir" in output:
                 config.save_dir = Path(output["save_dir"]).expanduser()
             if "default_format" in output:
@@ -71,12 +88,26 @@ class Config:
                 config.cache_ttl_searches = cache["ttl_searches"]
             if "ttl_counts" in cache:
                 config.cache_ttl_counts = cache["ttl_counts"]
+            if "ttl_timelines" in cache:
+                config.cache_ttl_timelines = cache["ttl_timelines"]
+            if "ttl_missing" in cache:
+                config.cache_ttl_missing = cache["ttl_missing"]
             if "max_size_mb" in cache:
                 config.cache_max_size_mb = cache["max_size_mb"]
+            if "write_behind" in cache:
+                config.cache_write_behind = cache["write_behind"]
+            if "memory_entries" in cache:
+                config.cache_memory_entries = cache["memory_entries"]
+            if "memory_max_mb" in cache:
+                config.cache_memory_max_mb = cache["memory_max_mb"]
+            if "codec" in cache:
+                config.cache_codec = cache["codec"]
             if "default_lang" in search:
                 config.search_default_lang = search["default_lang"]
             if "default_max" in search:
                 config.search_default_max = search["default_max"]
+            if "pool_size" in http:
+                config.http_pool_size = http["pool_size"]
         # Env overrides take precedence
         config.__post_init__()
         return config
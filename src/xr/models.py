@@ -28,9 +28,10 @@ class Tweet:
     url: str = ""
 
     @classmethod
-    def from_api(cls, data: dict, includes: dict | None = None) -> Tweet:
-        includes = includes or {}
-        users = _build_users_map(includes)
+    def from_api(cls, data: dict, includes: dict | None = None, users: dict[str, dict] | None = None) -> Tweet:
+        """``users`` is a prebuilt ``_build_users_map(includes)``; see ``parse_page``."""
+        if users is None:
+            users = _build_users_map(includes or {})
         author = users.get(data.get("author_id", ""), {})
         username = author.get("username", "unknown")
         metrics = data.get("public_metrics", {})
@@ -53,6 +54,20 @@ class Tweet:
             url=f"https://x.com/{username}/status/{data['id']}",
         )
 
+    @classmethod
+    def parse_page(cls, response: dict, limit: int | None = None) -> list[Tweet]:
+        """All tweets of an API response (the first ``limit``), indexing its includes once."""
+        users = _build_users_map(response.get("includes") or {})
+        return [cls.from_api(t, users=users) for t in response.get("data", [])[:limit]]
+
+    @property
+    def is_retweet(self) -> bool:
+        return any(r.get("type") == "retweeted" for r in self.referenced_tweets or [])
+
+    @property
+    def is_reply(self) -> bool:
+        return any(r.get("type") == "replied_to" for r in self.referenced_tweets or [])
+
     @property
     def date(self) -> str:
         if self.created_at:
@@ -0,0 +1,92 @@
+"""Parse X search syntax: canonical cache keys, and SQL over the local tweet index."""
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+# Optional leading "-", optional "operator:", then a quoted phrase or a bare word.
+TOKEN = re.compile(r'(-)?(?:(\w+):)?(?:"([^"]*)"|(\S+))')
+
+FLAGS = {
+    ("is", "retweet"): "is_retweet",
+    ("is", "reply"): "is_reply",
+    ("is", "quote"): "is_quote",
+    ("has", "links"): "has_links",
+    ("has", "media"): "has_media",
+}
+
+class QueryError(ValueError):
+    pass
+
+@dataclass
+class LocalQuery:
+    """A parsed query: FTS5 expressions plus SQL conditions on ``tweet_index i``."""
+    match: str = ""
+    exclude: str = ""
+    where: list[str] = field(default_factory=list)
+    params: list = field(default_factory=list)
+
+def _fts_term(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+def _date(value: str) -> int:
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise QueryError(f"Invalid date: {value} (use YYYY-MM-DD)") from None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def canonical_query(query: str) -> str:
+    """Normalize X search syntax so equivalent queries share a cache key.
+
+    Matching is case-insensitive and space-separated terms are ANDed, so
+    terms are lowercased, deduplicated and sorted. Queries using ``OR`` or
+    parentheses, whose meaning depends on order, only have their case and
+    whitespace normalized.
+    """
+    terms = [t if t == "OR" else t.lower() for t in (m.group(0) for m in TOKEN.finditer(query))]
+    if "OR" in terms or "(" in query or ")" in query:
+        return " ".join(terms)
+    return " ".join(sorted(set(terms)))
+
+def parse_query(query: str) -> LocalQuery:
+    """Parse a subset of X search syntax.
+
+    Words and "quoted phrases" must all match (``OR`` between words is
+    honoured; operators always apply), ``-word`` excludes. Operators: ``from:``, ``lang:``,
+    ``is:retweet|reply|quote``, ``has:links|media`` (each negatable with
+    ``-``), and ``since:``/``until:`` dates.
+    """
+    q = LocalQuery()
+    terms, excluded = [], []
+    for m in TOKEN.finditer(query):
+        negated, op, phrase, word = bool(m.group(1)), m.group(2), m.group(3), m.group(4)
+        value = phrase if phrase is not None else word
+        if op is None:
+            if phrase is None and value == "OR" and not negated:
+                if terms and terms[-1] != "OR":
+                    terms.append("OR")
+            elif value:
+                (excluded if negated else terms).append(_fts_term(value))
+            continue
+        op = op.lower()
+        if op == "from":
+            q.where.append(f"i.author_id {'NOT IN' if negated else 'IN'} (SELECT user_id FROM users WHERE username = ?)")
+            q.params.append(value.lstrip("@").lower())
+        elif op == "lang":
+            q.where.append(f"i.lang {'IS NOT' if negated else '='} ?")
+            q.params.append(value.lower())
+        elif (op, value.lower()) in FLAGS:
+            q.where.append(f"i.{FLAGS[op, value.lower()]} = {0 if negated else 1}")
+        elif op in ("since", "until") and not negated:
+            q.where.append(f"i.created_at {'>=' if op == 'since' else '<'} ?")
+            q.params.append(_date(value))
+        else:
+            raise QueryError(f"Unsupported operator: {m.group(0)}")
+    while terms and terms[-1] == "OR":
+        terms.pop()
+    q.match = " ".join(terms)
+    q.exclude = " OR ".join(excluded)
+    return q
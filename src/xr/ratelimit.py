@@ -0,0 +1,116 @@
+"""Rate-limit budget shared by every xr process on the machine."""
+from __future__ import annotations
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Mapping
+
+# Once this fraction of a window's budget is left, spread the remaining
+# requests evenly over the rest of the window instead of bursting into 429s.
+PACE_THRESHOLD = 0.1
+
+def _ratelimit_path() -> Path:
+    xdg = os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache"))
+    return Path(xdg) / "xr" / "ratelimit.db"
+
+def endpoint_key(endpoint: str) -> str:
+    """Collapse path parameters so e.g. every users/{id}/tweets call shares one budget."""
+    parts = endpoint.strip("/").split("/")
+    if parts[:3] == ["users", "by", "username"] and len(parts) > 3:
+        parts[3] = ":username"
+    return "/".join(":id" if p.isdigit() else p for p in parts)
+
+class RateLimiter:
+    """Per-endpoint budget from x-rate-limit-* headers, stored in SQLite.
+
+    Each request reserves one unit of the budget inside an IMMEDIATE
+    transaction, so concurrent processes never spend the same unit twice.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = path or _ratelimit_path()
+        self._conn: sqlite3.Connection | None = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    endpoint TEXT PRIMARY KEY,
+                    lim INTEGER NOT NULL,
+                    remaining INTEGER NOT NULL,
+                    reset_at INTEGER NOT NULL,
+                    next_at REAL NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )
+            """)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def acquire(self, endpoint: str):
+        """Block until a request to ``endpoint`` fits the budget, then reserve it."""
+        key = endpoint_key(endpoint)
+        while True:
+            wait = self._reserve(key)
+            if wait <= 0:
+                return
+            if wait >= 1:
+                print(f"Rate budget low for {key}. Waiting {wait:.0f}s...", file=sys.stderr)
+            time.sleep(wait)
+
+    def _reserve(self, key: str) -> float:
+        """Take one unit of budget, or return how long to wait before retrying."""
+        conn = self._db()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT lim, remaining, reset_at, next_at FROM rate_limits WHERE endpoint = ?", (key,)
+            ).fetchone()
+            if row is None or row[2] <= now:
+                return 0  # no budget known for the current window
+            lim, remaining, reset_at, next_at = row
+            if remaining <= 0:
+                return reset_at - now + 1
+            if remaining <= lim * PACE_THRESHOLD:
+                if next_at > now:
+                    return next_at - now
+                next_at = now + (reset_at - now) / remaining
+            conn.execute(
+                "UPDATE rate_limits SET remaining = remaining - 1, next_at = ? WHERE endpoint = ?",
+                (next_at, key),
+            )
+            return 0
+        finally:
+            conn.execute("COMMIT")
+
+    def record(self, endpoint: str, headers: Mapping[str, str]):
+        """Store the budget reported by a response's x-rate-limit-* headers."""
+        try:
+            lim = int(headers["x-rate-limit-limit"])
+            remaining = int(headers["x-rate-limit-remaining"])
+            reset_at = int(headers["x-rate-limit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        conn = self._db()
+        # Within the same window, keep the lower count: other processes may
+        # have reserved units after this response was produced.
+        conn.execute("""
+            INSERT INTO rate_limits (endpoint, lim, remaining, reset_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(endpoint) DO UPDATE SET
+                lim = excluded.lim,
+                remaining = CASE WHEN reset_at = excluded.reset_at
+                    THEN MIN(remaining, excluded.remaining) ELSE excluded.remaining END,
+                next_at = CASE WHEN reset_at = excluded.reset_at THEN next_at ELSE 0 END,
+                reset_at = excluded.reset_at,
+                updated_at = excluded.updated_at
+        """, (endpoint_key(endpoint), lim, remaining, reset_at, time.time()))
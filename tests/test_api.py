@@ -1,7 +1,7 @@
 """Tests for API client."""
 import pytest
 from unittest.mock import patch, MagicMock
-from xr.api import XClient, RateLimitError, APIError
+from xr.api import XClient, RateLimitError, APIError, NotFoundError, OfflineError, not_found, paginate
 
 @pytest.fixture
 def client():
@@ -10,6 +10,24 @@ def client():
 def test_client_builds_url(client):
     assert client._url("tweets/123") == "https://api.x.com/2/tweets/123"
 
+def test_client_custom_base_url():
+    client = XClient(bearer_token="t", base_url="http://127.0.0.1:8080/2/")
+    assert client._url("tweets/123") == "http://127.0.0.1:8080/2/tweets/123"
+
+def test_client_pool_size():
+    client = XClient(bearer_token="t", pool_size=4)
+    adapter = client.session.get_adapter("https://api.x.com/2/tweets")
+    assert adapter._pool_maxsize == 4
+
+def test_client_reuses_session(client):
+    mock_resp = MagicMock()
+    mock_resp.ok = True
+    mock_resp.json.return_value = {"data": {}}
+    with patch.object(client.session, "get", return_value=mock_resp) as get:
+        client.get("tweets/1")
+        client.get("tweets/2")
+    assert get.call_count == 2
+
 def test_client_sets_auth_header(client):
     assert client._headers()["Authorization"] == "Bearer test-token"
 
@@ -19,7 +37,7 @@ def test_rate_limit_raises(client):
     mock_resp.headers = {"x-rate-limit-reset": "0"}
     mock_resp.ok = False
     mock_resp.text = "rate limited"
-    with patch("requests.get", return_value=mock_resp), \
+    with patch.object(client.session, "get", return_value=mock_resp), \
          patch("time.sleep"):
         with pytest.raises(RateLimitError):
             client.get("tweets/123")
@@ -29,6 +47,78 @@ def test_not_found_raises(client):
     mock_resp.status_code = 404
     mock_resp.ok = False
     mock_resp.text = "not found"
-    with patch("requests.get", return_value=mock_resp):
-        with pytest.raises(APIError, match="404"):
+    with patch.object(client.session, "get", return_value=mock_resp):
+        with pytest.raises(NotFoundError, match="404") as exc:
             client.get("tweets/123")
+    assert isinstance(exc.value, APIError) and exc.value.resource == "tweets/123"
+
+def test_not_found_errors_in_response():
+    response = {"errors": [
+        {"value": "1", "resource_type": "tweet", "detail": "Could not find tweet with ids: [1].",
+         "type": "https://api.twitter.com/2/problems/resource-not-found"},
+        {"value": "2", "resource_type": "tweet", "title": "Authorization Error",
+         "type": "https://api.twitter.com/2/problems/not-authorized-for-resource"},
+        {"value": "3", "resource_type": "tweet", "type": "https://api.twitter.com/2/problems/client-forbidden"},
+    ]}
+    assert not_found(response, "tweet") == {"1": "Could not find tweet with ids: [1].", "2": "Authorization Error"}
+    assert not_found(response, "user") == {}
+
+def test_token_provider_is_lazy():
+    provider = MagicMock(return_value="lazy-token")
+    client = XClient(token_provider=provider)
+    provider.assert_not_called()
+    assert client._headers()["Authorization"] == "Bearer lazy-token"
+    client._headers()
+    provider.assert_called_once_with(False)
+
+def test_unauthorized_refreshes_token_once():
+    provider = MagicMock(side_effect=["stale", "fresh"])
+    client = XClient(token_provider=provider)
+    denied = MagicMock(ok=False, status_code=401, text="unauthorized")
+    ok = MagicMock(ok=True)
+    ok.json.return_value = {"data": {"id": "1"}}
+    with patch.object(client.session, "get", side_effect=[denied, ok]) as get:
+        assert client.get("tweets/1") == {"data": {"id": "1"}}
+    provider.assert_called_with(True)
+    assert get.call_args.kwargs["headers"]["Authorization"] == "Bearer fresh"
+
+def _pages(*pages):
+    client = MagicMock()
+    client.get.side_effect = list(pages)
+    return client
+
+def test_paginate_follows_next_token():
+    client = _pages(
+        {"data": [{"id": "1"}] * 100, "meta": {"next_token": "abc"}},
+        {"data": [{"id": "2"}] * 50, "meta": {}},
+    )
+    pages = list(paginate(client, "users/1/tweets", {"expansions": "author_id"}, 500))
+    assert len(pages) == 2
+    first, second = [c.args[1] for c in client.get.call_args_list]
+    assert "pagination_token" not in first
+    assert second["pagination_token"] == "abc"
+    assert second["expansions"] == "author_id"
+
+def test_paginate_does_not_overfetch_last_page():
+    client = _pages(
+        {"data": [{"id": "1"}] * 100, "meta": {"next_token": "abc"}},
+        {"data": [{"id": "2"}] * 30, "meta": {"next_token": "def"}},
+    )
+    pages = list(paginate(client, "tweets/search/recent", {}, 130, token_param="next_token"))
+    assert len(pages) == 2
+    assert client.get.call_args_list[1].args[1]["max_results"] == 30
+    assert client.get.call_args_list[1].args[1]["next_token"] == "abc"
+
+def test_paginate_is_lazy():
+    client = _pages({"data": [{"id": "1"}], "meta": {"next_token": "abc"}})
+    pages = paginate(client, "users/1/tweets", {}, 10, min_page_size=5)
+    client.get.assert_not_called()
+    next(pages)
+    assert client.get.call_args.args[1]["max_results"] == 10
+
+def test_offline_client_never_connects():
+    session = MagicMock()
+    client = XClient(session=session, offline=True)
+    with pytest.raises(OfflineError):
+        client.get("tweets/1")
+    session.get.assert_not_called()
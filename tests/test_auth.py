@@ -1,6 +1,8 @@
 """Tests for authentication."""
+import threading
 from pathlib import Path
-from xr.auth import load_credentials, CredentialError
+from unittest.mock import patch
+from xr.auth import load_credentials, get_cached_bearer_token, CredentialError
 import pytest
 
 def test_load_from_toml(tmp_path):
@@ -22,3 +24,35 @@ def test_load_missing_raises(monkeypatch, tmp_path):
     monkeypatch.delenv("XR_CONSUMER_SECRET", raising=False)
     with pytest.raises(CredentialError):
         load_credentials(tmp_path / "nonexistent.toml")
+
+def test_cached_token_reused(tmp_path):
+    path = tmp_path / "token.json"
+    with patch("xr.auth.get_bearer_token", return_value="tok1") as gen:
+        assert get_cached_bearer_token("key", "secret", path=path) == "tok1"
+        assert get_cached_bearer_token("key", "secret", path=path) == "tok1"
+    gen.assert_called_once()
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert "key" not in path.read_text()
+
+def test_cached_token_refresh_and_keying(tmp_path):
+    path = tmp_path / "token.json"
+    with patch("xr.auth.get_bearer_token", side_effect=["a", "b", "c"]):
+        assert get_cached_bearer_token("key1", "s", path=path) == "a"
+        assert get_cached_bearer_token("key2", "s", path=path) == "b"
+        assert get_cached_bearer_token("key1", "s", refresh=True, path=path) == "c"
+        assert get_cached_bearer_token("key2", "s", path=path) == "b"
+
+def test_cached_token_concurrent_refresh(tmp_path):
+    path = tmp_path / "token.json"
+    with patch("xr.auth.get_bearer_token", return_value="tok"):
+        threads = [
+            threading.Thread(target=get_cached_bearer_token, args=("key", "s"), kwargs={"refresh": True, "path": path})
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert list(tmp_path.iterdir()) == [path]
+    assert get_cached_bearer_token("key", "s", path=path) == "tok"
+    assert path.stat().st_mode & 0o777 == 0o600
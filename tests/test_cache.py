@@ -1,7 +1,14 @@
 """Tests for SQLite cache."""
+import dataclasses
 import json
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
 import time
-from xr.cache import Cache
+import pytest
+from xr.cache import CODEC_TAGS, CODECS, Cache, MemoryTier, decode, get_codec
 
 def test_cache_tweet_roundtrip(tmp_path):
     cache = Cache(tmp_path / "test.db")
@@ -41,3 +48,510 @@ def test_cache_cleanup(tmp_path):
     for i in range(100):
         cache.put_tweet(str(i), {"id": str(i), "text": "x" * 100})
     cache.cleanup(max_size_mb=0)  # Force cleanup
+
+def test_cache_get_tweets_bulk(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    for i in range(5):
+        cache.put_tweet(str(i), {"id": str(i)})
+    result = cache.get_tweets(["4", "1", "missing"], ttl=3600)
+    assert result == {"4": {"id": "4"}, "1": {"id": "1"}}
+    assert cache.get_tweets(["1"], ttl=0) == {}
+
+def _page_tweet(tweet_id, author_id="1"):
+    return {
+        "data": {"id": tweet_id, "text": "hi", "author_id": author_id},
+        "includes": {"users": [
+            {"id": str(i), "username": f"user{i}", "name": f"User {i}"} for i in range(1, 51)
+        ]},
+    }
+
+def test_cache_tweet_includes_normalized(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    for i in range(10):
+        cache.put_tweet(str(i), _page_tweet(str(i), author_id=str(i % 2 + 1)))
+    blob = cache.conn.execute("SELECT data FROM tweets WHERE tweet_id = '3'").fetchone()[0]
+    assert "includes" not in decode(blob)
+    assert cache.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 2
+    result = cache.get_tweet("3", ttl=3600)
+    assert result["data"]["id"] == "3"
+    assert result["includes"]["users"] == [{"id": "2", "username": "user2", "name": "User 2"}]
+
+def test_cache_tweet_author_does_not_replace_profile(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    assert cache.get_user("user1", ttl=3600) is None
+    cache.put_tweet("10", _page_tweet("10"))
+    assert cache.get_user("user1", ttl=3600) is None  # partial record, not a profile
+    profile = {"data": {"id": "1", "username": "user1", "name": "User 1", "description": "bio"}}
+    cache.put_user("1", "user1", profile)
+    cache.put_tweet("11", _page_tweet("11"))
+    assert cache.get_user("user1", ttl=3600) == profile
+
+def test_cache_migrates_embedded_includes(tmp_path):
+    path = tmp_path / "test.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE tweets (tweet_id TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL NOT NULL);
+        CREATE TABLE users (user_id TEXT PRIMARY KEY, username TEXT UNIQUE, data TEXT NOT NULL, fetched_at REAL NOT NULL);
+    """)
+    conn.execute("INSERT INTO tweets VALUES ('5', ?, ?)", (json.dumps(_page_tweet("5")), time.time()))
+    conn.commit()
+    conn.close()
+    cache = Cache(path)
+    blob = cache.conn.execute("SELECT data FROM tweets WHERE tweet_id = '5'").fetchone()[0]
+    assert "includes" not in decode(blob)
+    assert cache.get_tweet("5", ttl=3600)["includes"]["users"][0]["username"] == "user1"
+
+def test_cache_put_users_bulk(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    users = [{"id": str(i), "username": f"user{i}"} for i in range(1000)]
+    cache.put_users(users)
+    assert cache.get_user("user42", ttl=3600) == {"data": {"id": "42", "username": "user42"}}
+    total = cache.conn.execute("SELECT SUM(LENGTH(data)) FROM users").fetchone()[0]
+    assert total < 100_000
+
+def test_cache_migrates_page_sized_user_rows(tmp_path):
+    path = tmp_path / "test.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE tweets (tweet_id TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL NOT NULL, author_id TEXT);
+        CREATE TABLE users (user_id TEXT PRIMARY KEY, username TEXT UNIQUE, data TEXT NOT NULL,
+                            fetched_at REAL NOT NULL, partial INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE searches (query_hash TEXT PRIMARY KEY, query TEXT NOT NULL, result_ids TEXT NOT NULL,
+                               fetched_at REAL NOT NULL);
+        CREATE TABLE counts (query_hash TEXT PRIMARY KEY, query TEXT NOT NULL, granularity TEXT NOT NULL,
+                             data TEXT NOT NULL, fetched_at REAL NOT NULL);
+        PRAGMA user_version = 1;
+    """)
+    page = {"data": [{"id": "1", "username": "a"}, {"id": "2", "username": "b"}], "meta": {}}
+    for uid, name in (("1", "a"), ("2", "b"), ("3", "c")):
+        conn.execute("INSERT INTO users (user_id, username, data, fetched_at) VALUES (?, ?, ?, ?)",
+                     (uid, name, json.dumps({"data": page}), time.time()))
+    conn.commit()
+    conn.close()
+    cache = Cache(path)
+    assert cache.get_user("b", ttl=3600) == {"data": {"id": "2", "username": "b"}}
+    assert cache.get_user("c", ttl=3600) is None
+
+def test_cache_uses_wal(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    assert cache.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_cache_put_tweets_batch(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    cache.put_tweets((str(i), _page_tweet(str(i))) for i in range(100))
+    assert len(cache.get_tweets([str(i) for i in range(100)], ttl=3600)) == 100
+    assert cache.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+
+def test_cache_write_behind_flushes(tmp_path):
+    path = tmp_path / "test.db"
+    cache = Cache(path, write_behind=True)
+    cache.put_tweets((str(i), {"id": str(i)}) for i in range(50))
+    cache.put_search("q", ["1", "2"])
+    cache.flush()
+    assert cache.get_search("q", ttl=3600) == ["1", "2"]
+    cache.put_tweet("late", {"id": "late"})
+    cache.close()
+    assert Cache(path).get_tweet("late", ttl=3600) == {"id": "late"}
+
+def test_cache_get_tweets_single_query_in_order(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    ids = [str(i) for i in range(100)]
+    cache.put_tweets((i, _page_tweet(i)) for i in ids)
+    statements = []
+    cache.conn.set_trace_callback(statements.append)
+    wanted = list(reversed(ids))
+    result = cache.get_tweets(wanted, ttl=3600)
+    assert len(statements) == 1
+    assert list(result) == wanted
+    assert result["7"]["includes"]["users"][0]["username"] == "user1"
+
+def test_memory_tier_evicts_by_count_and_bytes():
+    tier = MemoryTier(max_entries=3, max_bytes=100)
+    for i in range(4):
+        tier.put("tweets", str(i), {"id": i}, time.time(), 10)
+    assert tier.get("tweets", "0", ttl=3600) is None
+    assert tier.get("tweets", "1", ttl=3600) == {"id": 1}
+    tier.put("tweets", "big", {}, time.time(), 85)
+    assert len(tier) == 2  # "1" was used most recently, "2" and "3" evicted
+    assert tier.bytes == 95
+    assert tier.stats()["hits"] == 1 and tier.stats()["misses"] == 1
+
+def test_cache_memory_tier_serves_repeat_reads(tmp_path):
+    cache = Cache(tmp_path / "test.db", memory_entries=100)
+    cache.put_user("1", "naval", {"data": {"id": "1", "username": "naval"}})
+    cache.put_tweet("5", _page_tweet("5"))
+    cache.get_user("naval", ttl=3600)
+    cache.get_tweet("5", ttl=3600)
+    statements = []
+    cache.conn.set_trace_callback(statements.append)
+    assert cache.get_user("naval", ttl=3600)["data"]["username"] == "naval"
+    assert cache.get_tweets(["5"], ttl=3600)["5"]["data"]["id"] == "5"
+    assert statements == []
+    assert cache.memory.hits == 2
+    cache.put_user("1", "naval", {"data": {"id": "1", "username": "naval", "name": "new"}})
+    assert cache.get_user("naval", ttl=3600)["data"]["name"] == "new"
+
+def test_cache_usage_accounting(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    cache.put_tweet("1", {"id": "1", "text": "x" * 100})
+    size = cache.size_bytes()
+    blob = cache.conn.execute("SELECT data FROM tweets").fetchone()[0]
+    assert size == len(blob)
+    cache.put_tweet("1", {"id": "1", "text": "".join(map(str, range(100)))})
+    blob = cache.conn.execute("SELECT data FROM tweets").fetchone()[0]
+    assert cache.size_bytes() == len(blob) > size
+    cache.put_search("q", ["1"])
+    rows = dict(cache.conn.execute("SELECT tbl, rows FROM usage"))
+    assert rows["tweets"] == 1 and rows["searches"] == 1
+    assert cache.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # incremental
+
+def _noise(i, words=200):
+    rng = random.Random(i)
+    return " ".join(rng.randbytes(4).hex() for _ in range(words))  # compresses poorly
+
+def test_cache_evicts_least_recently_accessed(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    for i in range(100):
+        cache.put_tweet(str(i), _indexed_tweet(str(i), _noise(i)))
+    # Tweet 0 was fetched first but read most recently.
+    cache.conn.execute("UPDATE tweets SET last_access = last_access - 3600 WHERE tweet_id != '0'")
+    cache.conn.commit()
+    limit = cache.db_bytes() // 2
+    assert cache.evict(limit, time_budget=None) > 0
+    assert cache.db_bytes() <= limit
+    assert cache.get_tweet("0", ttl=3600) is not None
+    assert cache.get_tweet("1", ttl=3600) is None
+    assert cache.search_local(_noise(1)[:20]) == []
+
+def test_cache_evicts_automatically_over_limit(tmp_path):
+    path = tmp_path / "test.db"
+    base = Cache(path).db_bytes()
+    limit = base + 64 * 1024
+    cache = Cache(path, max_size_mb=limit / 1024 / 1024, ttl_missing=60)
+    cache.put_missing("tweet", {"999": "Not Found"})
+    cache.conn.execute("UPDATE missing SET fetched_at = 0")
+    cache.conn.commit()
+    for i in range(100):
+        cache.put_tweet(str(i), _indexed_tweet(str(i), _noise(i)))
+    cache.close()
+    cache = Cache(path)
+    assert cache.db_bytes() <= limit
+    assert cache.get_tweet("99", ttl=3600) is not None
+    assert cache.get_tweet("0", ttl=3600) is None
+    assert cache.conn.execute("SELECT COUNT(*) FROM missing").fetchone()[0] == 0
+
+def test_cache_stores_codec_tagged_blobs(tmp_path):
+    cache = Cache(tmp_path / "test.db", codec="zlib")
+    payload = {"data": {"id": "1", "text": "hello " * 200}}
+    cache.put_tweet("1", payload)
+    blob = cache.conn.execute("SELECT data FROM tweets").fetchone()[0]
+    assert isinstance(blob, bytes) and blob[0] == CODECS["zlib"].tag
+    assert len(blob) < len(json.dumps(payload)) / 4
+    assert cache.get_tweet("1", ttl=3600)["data"] == payload["data"]
+
+def test_cache_reads_legacy_json_and_recompresses(tmp_path):
+    cache = Cache(tmp_path / "test.db", codec="zlib")
+    legacy = json.dumps({"data": {"id": "42", "username": "u", "description": "x" * 500}})
+    cache.conn.execute(
+        "INSERT INTO users (user_id, username, data, fetched_at, last_access, size)"
+        " VALUES ('42', 'u', ?, ?, ?, ?)", (legacy, time.time(), time.time(), len(legacy)),
+    )
+    cache.conn.commit()
+    assert cache.get_user_by_id("42", ttl=3600)["data"]["username"] == "u"
+    rows, before, after, unreadable = cache.recompress()
+    assert rows == 1 and after < before and unreadable == 0
+    assert cache.size_bytes() == after
+    assert isinstance(cache.conn.execute("SELECT data FROM users").fetchone()[0], bytes)
+    assert cache.get_user_by_id("42", ttl=3600)["data"]["username"] == "u"
+    assert cache.recompress()[0] == 0
+
+def test_cache_treats_undecodable_rows_as_misses(tmp_path, monkeypatch):
+    cache = Cache(tmp_path / "test.db", codec="zlib")
+    cache.put_tweet("1", _page_tweet("1"))
+    cache.put_tweet("2", _page_tweet("2", author_id="2"))
+    cache.put_users([{"id": "3", "username": "u3"}])
+    # Rows written elsewhere with a codec whose packages are not installed here.
+    monkeypatch.setattr("xr.cache._OPTIONAL", {"zstandard": None, "msgpack": None})
+    cache.conn.execute("UPDATE tweets SET data = CAST(X'04' || substr(data, 2) AS BLOB) WHERE tweet_id = '1'")
+    cache.conn.execute("UPDATE users SET data = CAST(X'04' || substr(data, 2) AS BLOB) WHERE user_id IN ('2', '3')")
+    cache.conn.commit()
+    assert cache.get_tweets(["1", "2"], ttl=3600) == {}
+    assert cache.get_user("u3", ttl=3600) is None
+    remaining = {r[0] for r in cache.conn.execute("SELECT tweet_id FROM tweets")}
+    assert remaining == {"2"}  # its unreadable author row was dropped instead
+    assert cache.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+    cache.conn.execute("UPDATE tweets SET data = CAST(X'05' || substr(data, 2) AS BLOB)")
+    cache.conn.commit()
+    assert cache.recompress()[3] == 1
+    assert cache.conn.execute("SELECT COUNT(*) FROM tweets").fetchone()[0] == 0
+
+def test_get_codec_rejects_unknown():
+    with pytest.raises(ValueError):
+        get_codec("lz4")
+    assert get_codec("auto").available
+
+def test_cache_user_lookup_is_case_insensitive(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    profile = {"data": {"id": "7", "username": "Naval"}}
+    cache.put_user("7", "Naval", profile)
+    assert cache.get_user("naval", ttl=3600) == profile
+    assert cache.get_user("@NAVAL", ttl=3600) == profile
+    assert cache.get_user_by_id("7", ttl=3600) == profile
+
+def test_cache_renamed_handle_moves_to_new_id(tmp_path):
+    cache = Cache(tmp_path / "test.db", memory_entries=16)
+    cache.put_users([{"id": "1", "username": "handle"}])
+    assert cache.get_user("handle", ttl=3600)["data"]["id"] == "1"
+    # Account 1 renames; account 2 claims the old handle.
+    cache.put_users([{"id": "1", "username": "renamed"}, {"id": "2", "username": "Handle"}])
+    assert cache.get_user("handle", ttl=3600)["data"]["id"] == "2"
+    assert cache.get_user("renamed", ttl=3600)["data"]["id"] == "1"
+    assert cache.get_user_by_id("1", ttl=3600)["data"]["username"] == "renamed"
+
+def test_cache_migrates_usernames_to_folded(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    for uid, name, fetched_at in (("1", "Old", 1.0), ("2", "OLD", time.time()), ("3", "Mixed", time.time())):
+        cache.conn.execute("INSERT INTO users (user_id, username, data, fetched_at) VALUES (?, ?, ?, ?)",
+                           (uid, name, json.dumps({"data": {"id": uid, "username": name}}), fetched_at))
+    cache._migrate_v4()
+    assert cache.get_user("old", ttl=3600)["data"]["id"] == "2"
+    assert cache.get_user("mixed", ttl=3600)["data"]["id"] == "3"
+
+def test_cache_stale_ok_serves_expired(tmp_path):
+    cache = Cache(tmp_path / "test.db", stale_ok=True)
+    cache.put_search("q", ["1"])
+    assert cache.get_search("q", ttl=3600) == ["1"] and not cache.served_stale
+    assert cache.get_search("q", ttl=0) == ["1"]
+    assert cache.served_stale
+
+def test_cache_search_cursor_survives_expiry(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    cache.put_search("q", ["30", "20", "10"], next_token="tok")
+    assert cache.get_search("q", ttl=0) is None
+    cursor = cache.get_search_cursor("q")
+    assert cursor["ids"] == ["30", "20", "10"]
+    assert (cursor["newest_id"], cursor["oldest_id"], cursor["next_token"]) == ("30", "10", "tok")
+
+def _day(n: int) -> str:
+    return f"2026-01-{n:02d}T00:00:00.000Z"
+
+def test_cache_count_buckets_keep_closed_buckets(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    cache.put_count_buckets("q", "day", [
+        {"start": _day(1), "end": _day(2), "count": 10},
+        {"start": _day(2), "end": "2026-01-02T12:00:00.000Z", "count": 3},
+    ])
+    cache.put_count_buckets("q", "day", [
+        {"start": _day(1), "end": "2026-01-01T06:00:00.000Z", "count": 1},  # partial: ignored
+        {"start": _day(2), "end": _day(3), "count": 8},
+    ])
+    series = cache.get_count_series("Q", "day", ttl=3600)
+    assert series["fresh"]
+    assert [(b["count"], b["complete"]) for b in series["buckets"]] == [(10, True), (8, True)]
+    assert cache.get_count_series("q", "hour", ttl=3600) is None
+
+def test_cache_migrates_count_blobs_to_buckets(tmp_path):
+    path = tmp_path / "test.db"
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE counts (query_hash TEXT PRIMARY KEY, query TEXT NOT NULL, granularity TEXT NOT NULL,
+                             data TEXT NOT NULL, fetched_at REAL NOT NULL);
+    """)
+    buckets = [{"start": _day(1), "end": _day(2), "count": 5}]
+    conn.execute("INSERT INTO counts VALUES ('h', 'q', 'day', ?, ?)", (json.dumps({"buckets": buckets, "total": 5}), time.time()))
+    conn.commit()
+    conn.close()
+    cache = Cache(path)
+    assert [b["count"] for b in cache.get_count_series("q", "day", ttl=3600)["buckets"]] == [5]
+    tables = {r[0] for r in cache.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "counts" not in tables
+    cache.close()
+    assert "counts" not in {r[0] for r in Cache(path).conn.execute("SELECT name FROM sqlite_master")}
+
+def _indexed_tweet(tweet_id, text, **extra):
+    return {
+        "data": dict({"id": tweet_id, "text": text, "author_id": "1", "lang": "en",
+                      "created_at": "2026-01-15T12:00:00.000Z"}, **extra),
+        "includes": {"users": [{"id": "1", "username": "Alice"}]},
+    }
+
+def test_cache_stores_referenced_tweets_with_their_author(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    page = {"includes": {
+        "users": [{"id": "1", "username": "Alice"}, {"id": "2", "username": "Bob"}],
+        "tweets": [
+            {"id": "10", "text": "bitcoin original", "author_id": "2"},
+            {"id": "11", "text": "bitcoin by someone not included", "author_id": "3"},
+        ],
+    }}
+    cache.put_tweets([
+        ("20", dict(page, data=dict(_indexed_tweet("20", "RT bitcoin")["data"],
+                                    referenced_tweets=[{"type": "retweeted", "id": "10"}]))),
+        ("21", dict(page, data=dict(_indexed_tweet("21", "RT bitcoin again")["data"],
+                                    referenced_tweets=[{"type": "retweeted", "id": "11"}]))),
+    ])
+    ids = cache.search_local("bitcoin")
+    assert ids == ["21", "20", "10"]
+    assert set(cache.get_tweets(ids, ttl=3600)) == set(ids)
+    assert cache.get_tweet("10", ttl=3600)["includes"]["users"][0]["username"] == "Bob"
+
+def test_cache_search_local(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    cache.put_tweets([
+        ("10", _indexed_tweet("10", "Bitcoin ETF approved")),
+        ("11", _indexed_tweet("11", "RT bitcoin news", referenced_tweets=[{"type": "retweeted", "id": "10"}])),
+        ("12", _indexed_tweet("12", "Ethereum upgrade", lang="es", entities={"urls": [{"url": "https://t.co/x"}]})),
+    ])
+    assert cache.search_local("bitcoin") == ["11", "10"]
+    assert cache.search_local("bitcoin -is:retweet") == ["10"]
+    assert cache.search_local("from:alice has:links") == ["12"]
+    assert cache.search_local("ethereum OR bitcoin lang:es") == ["12"]
+    assert cache.search_local("from:bob") == []
+    assert cache.search_local("-bitcoin since:2026-01-01") == ["12"]
+    assert cache.search_local("until:2026-01-01") == []
+
+def test_cache_search_index_follows_tweets_table(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    cache.put_tweet("10", _indexed_tweet("10", "first draft"))
+    cache.put_tweet("10", _indexed_tweet("10", "edited text"))
+    assert cache.search_local("draft") == []
+    assert cache.search_local("edited") == ["10"]
+    cache.cleanup(max_size_mb=0)
+    assert cache.search_local("edited") == []
+    assert cache.conn.execute("SELECT COUNT(*) FROM tweet_index").fetchone()[0] == 0
+
+def test_cache_export_merge_newest_wins(tmp_path):
+    source = Cache(tmp_path / "source.db")
+    source.put_tweet("10", _indexed_tweet("10", "snapshot version"))
+    source.put_tweet("11", _indexed_tweet("11", "only in snapshot"))
+    source.put_search("bitcoin", ["10", "11"])
+    source.put_count_buckets("q", "day", [{"start": _day(1), "end": _day(2), "count": 7}])
+    source.export(tmp_path / "snap.db")
+    source.close()
+
+    cache = Cache(tmp_path / "test.db")
+    cache.put_tweet("10", _indexed_tweet("10", "local version"))
+    cache.put_tweet("12", _indexed_tweet("12", "only local"))
+    cache.put_count_buckets("q", "day", [{"start": _day(1), "end": "2026-01-01T06:00:00.000Z", "count": 3}])
+    cache.conn.execute("UPDATE tweets SET fetched_at = fetched_at + 60 WHERE tweet_id = '10'")
+    cache.conn.commit()
+    merged = cache.merge(tmp_path / "snap.db")
+    assert merged["tweets"] == 1
+    assert cache.get_tweet("10", ttl=3600)["data"]["text"] == "local version"
+    assert cache.get_tweet("11", ttl=3600)["data"]["text"] == "only in snapshot"
+    assert cache.get_search("bitcoin", ttl=3600) == ["10", "11"]
+    assert [b["count"] for b in cache.get_count_series("q", "day", ttl=3600)["buckets"]] == [7]
+    assert cache.search_local("snapshot") == ["11"]
+    assert cache.search_local("version") == ["10"]
+
+def test_cache_merge_skips_entries_with_unavailable_codec(tmp_path, monkeypatch):
+    source = Cache(tmp_path / "source.db", codec="zlib")
+    source.put_tweet("10", _indexed_tweet("10", "portable"))
+    source.put_tweet("11", _indexed_tweet("11", "from a machine with zstd"))
+    source.close()
+    # A snapshot copied straight from a cache using a codec that is missing here.
+    conn = sqlite3.connect(str(tmp_path / "source.db"))
+    conn.execute("UPDATE tweets SET data = CAST(X'04' || substr(data, 2) AS BLOB) WHERE tweet_id = '11'")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr("xr.cache._OPTIONAL", {"zstandard": None, "msgpack": None})
+
+    cache = Cache(tmp_path / "test.db", codec="zlib")
+    merged = cache.merge(tmp_path / "source.db")
+    assert merged["tweets"] == 1
+    assert merged["unreadable"] == 1
+    assert cache.get_tweet("10", ttl=3600)["data"]["text"] == "portable"
+    assert cache.get_tweet("11", ttl=3600) is None
+
+def test_cache_export_uses_portable_codec(tmp_path, monkeypatch):
+    source = Cache(tmp_path / "source.db", codec="zlib")
+    source.put_tweet("10", _indexed_tweet("10", "hello"))
+    # As if written with zstd: recoded on export while the package is available.
+    source.conn.execute("UPDATE tweets SET data = CAST(X'02' || substr(data, 2) AS BLOB)")
+    source.conn.commit()
+    monkeypatch.setitem(CODEC_TAGS, 2, dataclasses.replace(CODECS["zlib"], name="zstd", tag=2))
+    source.export(tmp_path / "snap.db")
+    source.close()
+    conn = sqlite3.connect(str(tmp_path / "snap.db"))
+    assert conn.execute("SELECT hex(substr(data, 1, 1)) FROM tweets").fetchall() == [("01",)]
+    conn.close()
+
+def test_cache_stats_persist_across_processes(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    cache.put_tweet("10", _indexed_tweet("10", "hello"))
+    cache.get_tweets(["10", "11"], ttl=3600)
+    cache.get_tweets(["10"], ttl=0)
+    cache.close()
+    cache = Cache(tmp_path / "test.db")
+    assert cache.get_search("q", ttl=3600) is None
+    stats = cache.stats()["tables"]
+    assert {k: stats["tweets"][k] for k in ("rows", "hits", "misses", "expired", "reads", "writes")} == {
+        "rows": 1, "hits": 1, "misses": 1, "expired": 1, "reads": 2, "writes": 1,
+    }
+    assert stats["tweets"]["hit_rate"] == pytest.approx(1 / 3)
+    assert stats["searches"]["misses"] == 1
+    assert stats["timelines"]["hit_rate"] is None
+
+STRESS_WORKER = """
+import sys
+from pathlib import Path
+from xr.cache import Cache
+path, worker, n = Path(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+with Cache(path) as cache:
+    for i in range(n):
+        tweet_id = str(worker * 1000 + i)
+        cache.put_tweet(tweet_id, {"data": {"id": tweet_id, "text": "t", "author_id": str(worker)},
+                                   "includes": {"users": [{"id": str(worker), "username": f"u{worker}"}]}})
+        cache.put_search(f"q{worker}", [tweet_id])
+        cache.get_tweets([str(w * 1000 + i) for w in range(8)], ttl=3600)
+        cache.search_local("t", limit=5)
+"""
+
+def test_cache_concurrent_processes_lose_no_writes(tmp_path):
+    path, workers, n = tmp_path / "test.db", 8, 40
+    procs = [
+        subprocess.Popen([sys.executable, "-c", STRESS_WORKER, str(path), str(w), str(n)], stderr=subprocess.PIPE)
+        for w in range(workers)
+    ]
+    for proc in procs:
+        _, err = proc.communicate(timeout=120)
+        assert proc.returncode == 0 and not err, err.decode()
+    with Cache(path) as cache:
+        ids = [str(w * 1000 + i) for w in range(workers) for i in range(n)]
+        assert len(cache.get_tweets(ids, ttl=3600)) == workers * n
+        assert all(cache.get_search(f"q{w}", ttl=3600) == [str(w * 1000 + n - 1)] for w in range(workers))
+        version = cache.conn.execute("PRAGMA user_version").fetchone()[0]
+    with Cache(tmp_path / "fresh.db") as fresh:
+        assert version == fresh.conn.execute("PRAGMA user_version").fetchone()[0]
+
+def test_cache_shared_across_threads(tmp_path):
+    cache = Cache(tmp_path / "test.db", memory_entries=64)
+    errors = []
+
+    def work(worker):
+        try:
+            for i in range(50):
+                tweet_id = str(worker * 1000 + i)
+                cache.put_tweet(tweet_id, _indexed_tweet(tweet_id, "threaded"))
+                assert tweet_id in cache.get_tweets([tweet_id], ttl=3600)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(w,)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert cache.conn.execute("SELECT COUNT(*) FROM tweets").fetchone()[0] == 200
+    cache.close()
+
+def test_cache_search_serves_subsets_per_sort(tmp_path):
+    cache = Cache(tmp_path / "test.db")
+    cache.put_search("from:a lang:en", ["3", "2", "1"], next_token="tok")
+    assert cache.get_search("lang:en from:A", ttl=3600, max_results=2) == ["3", "2"]
+    assert cache.get_search("from:a lang:en", ttl=3600, max_results=5) is None  # not complete
+    assert cache.get_search("from:a lang:en", ttl=3600, max_results=2, sort="relevancy") is None
+    cache.put_search("from:a lang:en", ["1"], complete=True, sort="relevancy")
+    assert cache.get_search("from:a lang:en", ttl=3600, max_results=5, sort="relevancy") == ["1"]
+    assert cache.get_search("from:a lang:en", ttl=3600) == ["3", "2", "1"]
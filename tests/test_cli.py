@@ -1,6 +1,8 @@
 """Tests for CLI entry point."""
+import json
 import pytest
 from click.testing import CliRunner
+from xr.cache import Cache
 from xr.cli import main
 
 @pytest.fixture
@@ -18,3 +20,98 @@ def test_help(runner):
     assert "tweet" in result.output
     assert "search" in result.output
     assert "user" in result.output
+
+def test_tweet_requires_input(runner):
+    result = runner.invoke(main, ["tweet"], input="")
+    assert result.exit_code == 2
+    assert "at least one tweet" in result.output
+
+def test_stdin_is_read_only_with_dash(runner):
+    # An inherited pipe without '-' is ignored rather than read (and waited on).
+    result = runner.invoke(main, ["user"], input="naval\n")
+    assert result.exit_code == 2
+    assert "at least one username" in result.output
+    result = runner.invoke(main, ["tweet", "-"], input="\n")
+    assert "at least one tweet" in result.output
+
+@pytest.fixture
+def cache_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    with Cache() as cache:
+        cache.put_tweet("5", {
+            "data": {"id": "5", "text": "cached hello", "author_id": "1"},
+            "includes": {"users": [{"id": "1", "username": "user1", "name": "User"}]},
+        })
+        cache.conn.execute("UPDATE tweets SET fetched_at = 0")  # long expired
+        cache.conn.commit()
+    return tmp_path
+
+def test_offline_serves_expired_cache(runner, cache_home):
+    result = runner.invoke(main, ["--offline", "tweet", "5"])
+    assert result.exit_code == 0, result.output
+    assert "cached hello" in result.output
+
+def test_offline_miss_fails_without_network(runner, cache_home):
+    result = runner.invoke(main, ["--offline", "tweet", "6"])
+    assert result.exit_code == 1
+    assert "Not cached: tweets" in result.output
+
+def test_offline_batch_serves_cached_and_reports_rest(runner, cache_home):
+    result = runner.invoke(main, ["--offline", "tweet", "5", "6"])
+    assert result.exit_code == 0, result.output
+    assert "cached hello" in result.output
+    assert "Not found: 6" in result.output
+    with Cache() as cache:
+        cache.put_user("1", "user1", {"data": {"id": "1", "username": "user1", "name": "User"}})
+    result = runner.invoke(main, ["--offline", "user", "user1", "nobody"])
+    assert result.exit_code == 0, result.output
+    assert "@user1" in result.output
+    assert "Not found: nobody" in result.output
+
+def test_unusable_codec_is_reported(runner, cache_home):
+    config_dir = cache_home / "config" / "xr"
+    config_dir.mkdir(parents=True)
+    (config_dir / "config.toml").write_text('[cache]\ncodec = "lz4"\n')
+    for args in (["--offline", "tweet", "5"], ["local", "search", "hello"], ["cache", "export", str(cache_home / "s.db")]):
+        result = runner.invoke(main, args)
+        assert result.exit_code == 1, args
+        assert "[cache] codec: Unknown cache codec: lz4" in result.output
+
+def test_stale_ok_refreshes_in_background(runner, cache_home, monkeypatch):
+    spawned = []
+    monkeypatch.setattr("xr.cli.subprocess.Popen", lambda args, **kw: spawned.append(args))
+    monkeypatch.setattr("xr.cli.load_credentials", lambda: ("key", "secret"))
+    monkeypatch.setattr("sys.argv", ["xr", "--stale-ok", "tweet", "5"])
+    result = runner.invoke(main, ["--stale-ok", "tweet", "5"])
+    assert result.exit_code == 0, result.output
+    assert "cached hello" in result.output
+    assert spawned and spawned[0][-3:] == ["xr", "tweet", "5"]
+
+def test_stale_ok_refresh_passes_stdin_usernames(runner, cache_home, monkeypatch):
+    with Cache() as cache:
+        cache.put_user("1", "user1", {"data": {"id": "1", "username": "user1", "name": "User"}})
+        cache.conn.execute("UPDATE users SET fetched_at = 0")
+        cache.conn.commit()
+    spawned = []
+    monkeypatch.setattr("xr.cli.subprocess.Popen", lambda args, **kw: spawned.append(args))
+    monkeypatch.setattr("xr.cli.load_credentials", lambda: ("key", "secret"))
+    monkeypatch.setattr("sys.argv", ["xr", "--stale-ok", "user", "-"])
+    result = runner.invoke(main, ["--stale-ok", "user", "-"], input="user1\n")
+    assert result.exit_code == 0, result.output
+    assert "user1" in result.output
+    assert spawned and spawned[0][-3:] == ["xr", "user", "user1"]
+
+def test_local_search(runner, cache_home):
+    result = runner.invoke(main, ["local", "search", "hello from:user1"])
+    assert result.exit_code == 0, result.output
+    assert "cached hello" in result.output
+    result = runner.invoke(main, ["local", "search", "url:x"])
+    assert result.exit_code == 2
+
+def test_cache_stats_json(runner, cache_home):
+    runner.invoke(main, ["--offline", "tweet", "5"])
+    result = runner.invoke(main, ["cache", "stats", "--json"])
+    assert result.exit_code == 0, result.output
+    tweets = json.loads(result.output)["tables"]["tweets"]
+    assert (tweets["rows"], tweets["hits"], tweets["misses"]) == (1, 1, 0)
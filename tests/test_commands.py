@@ -1,14 +1,18 @@
 """Tests for command logic."""
+import time
 from unittest.mock import MagicMock
-from xr.commands.tweet import fetch_tweet
-from xr.commands.user import fetch_user
+import pytest
+from xr.commands.tweet import fetch_tweet, fetch_tweets
+from xr.commands.user import fetch_user, fetch_users
 from xr.commands.search import fetch_search
+from xr.commands.timeline import fetch_timeline
 
 def test_fetch_tweet(sample_tweet):
     client = MagicMock()
     client.get.return_value = sample_tweet
     cache = MagicMock()
     cache.get_tweet.return_value = None
+    cache.get_missing.return_value = {}
 
     tweet = fetch_tweet(client, cache, "123456", ttl=3600)
     assert tweet.id == "123456"
@@ -30,6 +34,7 @@ def test_fetch_user(sample_user):
     client.get.return_value = sample_user
     cache = MagicMock()
     cache.get_user.return_value = None
+    cache.get_missing.return_value = {}
 
     user = fetch_user(client, cache, "testuser", ttl=86400)
     assert user.username == "testuser"
@@ -40,8 +45,286 @@ def test_fetch_search(sample_search):
     client.get.return_value = sample_search
     cache = MagicMock()
     cache.get_search.return_value = None
+    cache.get_search_cursor.return_value = None
     cache.get_tweet.return_value = None
 
     result = fetch_search(client, cache, "test query", max_results=10, ttl_search=3600, ttl_tweet=604800)
     assert result.total == 1
     assert result.tweets[0].text == "Hello world"
+
+def test_fetch_timeline_paginates(sample_user, sample_tweet):
+    tweet = sample_tweet["data"]
+    client = MagicMock()
+    client.get.side_effect = [
+        sample_user,
+        {"data": [dict(tweet, id=str(i)) for i in range(100)], "includes": sample_tweet["includes"], "meta": {"next_token": "p2"}},
+        {"data": [dict(tweet, id=str(i)) for i in range(100, 200)], "includes": sample_tweet["includes"], "meta": {"next_token": "p3"}},
+    ]
+    cache = MagicMock()
+    cache.get_user.return_value = None
+    cache.get_missing.return_value = {}
+    cache.get_timeline.return_value = None
+
+    tweets, user = fetch_timeline(client, cache, "testuser", max_results=150)
+    assert len(tweets) == 150
+    assert tweets[-1].id == "149"
+    assert client.get.call_args_list[2].args[1]["max_results"] == 50
+
+def _timeline_client(sample_user, sample_tweet, tweets):
+    """Fake users/:id/tweets over ``tweets`` (newest first), honouring since_id/until_id."""
+    def get(endpoint, params=None):
+        if endpoint.startswith("users/by/username/"):
+            return sample_user
+        matching = [t for t in tweets
+                    if int(t["id"]) > int(params.get("since_id", 0))
+                    and int(t["id"]) < int(params.get("until_id", 10**30))]
+        page = matching[:params["max_results"]]
+        meta = {"next_token": "more"} if len(matching) > len(page) else {}
+        return {"data": page, "includes": sample_tweet["includes"], "meta": meta}
+    client = MagicMock()
+    client.get.side_effect = get
+    return client
+
+def test_fetch_timeline_refreshes_head_with_since_id(tmp_path, sample_user, sample_tweet):
+    from xr.cache import Cache
+    tweet = sample_tweet["data"]
+    tweets = [dict(tweet, id=str(i)) for i in range(110, 100, -1)]
+    cache = Cache(tmp_path / "test.db")
+    client = _timeline_client(sample_user, sample_tweet, tweets)
+    first, _ = fetch_timeline(client, cache, "testuser", max_results=5)
+    assert [t.id for t in first] == ["110", "109", "108", "107", "106"]
+
+    tweets.insert(0, dict(tweet, id="111"))
+    client.get.reset_mock()
+    second, _ = fetch_timeline(client, cache, "testuser", max_results=5, ttl_timeline=0)
+    assert [t.id for t in second] == ["111", "110", "109", "108", "107"]
+    (endpoint, params), = [c.args for c in client.get.call_args_list]
+    assert params["since_id"] == "110"
+
+    client.get.reset_mock()
+    fetch_timeline(client, cache, "testuser", max_results=5)
+    client.get.assert_not_called()  # index still fresh
+
+def test_fetch_timeline_backfills_and_filters_locally(tmp_path, sample_user, sample_tweet):
+    from xr.cache import Cache
+    tweet = sample_tweet["data"]
+    retweet = {"referenced_tweets": [{"type": "retweeted", "id": "1"}]}
+    tweets = [dict(tweet, id=str(i), **(retweet if i % 2 else {})) for i in range(120, 100, -1)]
+    cache = Cache(tmp_path / "test.db")
+    client = _timeline_client(sample_user, sample_tweet, tweets)
+    fetch_timeline(client, cache, "testuser", max_results=5)
+
+    client.get.reset_mock()
+    result, _ = fetch_timeline(client, cache, "testuser", max_results=5, no_retweets=True)
+    assert [t.id for t in result] == ["120", "118", "116", "114", "112"]
+    assert all("until_id" in c.args[1] for c in client.get.call_args_list)
+
+def test_fetch_timeline_filtered_backfill_uses_full_pages(tmp_path, sample_user, sample_tweet):
+    from xr.cache import Cache
+    tweet = sample_tweet["data"]
+    retweet = {"referenced_tweets": [{"type": "retweeted", "id": "1"}]}
+    # Nine in ten posts are retweets.
+    tweets = [dict(tweet, id=str(i), **(retweet if i % 10 else {})) for i in range(1300, 1000, -1)]
+    cache = Cache(tmp_path / "test.db")
+    client = _timeline_client(sample_user, sample_tweet, tweets)
+    result, _ = fetch_timeline(client, cache, "testuser", max_results=20, no_retweets=True)
+    assert [t.id for t in result] == [str(i) for i in range(1300, 1100, -10)]
+    timeline_calls = [c for c in client.get.call_args_list if "/tweets" in c.args[0]]
+    assert len(timeline_calls) <= 3
+
+def test_fetch_timeline_offline_serves_partial_index(tmp_path, sample_user, sample_tweet):
+    from xr.api import XClient
+    from xr.cache import Cache
+    tweet = sample_tweet["data"]
+    retweet = {"referenced_tweets": [{"type": "retweeted", "id": "1"}]}
+    tweets = [dict(tweet, id=str(i), **(retweet if i % 2 else {})) for i in range(120, 100, -1)]
+    cache = Cache(tmp_path / "test.db", stale_ok=True)
+    fetch_timeline(_timeline_client(sample_user, sample_tweet, tweets), cache, "testuser", max_results=10)
+    result, _ = fetch_timeline(XClient(offline=True), cache, "testuser", max_results=10, no_retweets=True)
+    assert [t.id for t in result] == ["120", "118", "116", "114", "112"]
+
+def test_fetch_tweets_batches_cache_misses(sample_tweet):
+    tweet = sample_tweet["data"]
+    ids = [str(i) for i in range(250)]
+    cached = {tid: {"data": dict(tweet, id=tid), "includes": sample_tweet["includes"]} for tid in ids[:30]}
+    client = MagicMock()
+    client.get.side_effect = lambda endpoint, params: {
+        "data": [dict(tweet, id=tid) for tid in params["ids"].split(",") if tid != "99"],
+        "includes": sample_tweet["includes"],
+    }
+    cache = MagicMock()
+    cache.get_tweets.return_value = cached
+
+    tweets = fetch_tweets(client, cache, ids + ["5"], ttl=3600)
+    cache.get_tweets.assert_called_once()
+    assert client.get.call_count == 3  # 220 misses -> 100 + 100 + 20
+    assert all(c.args[0] == "tweets" for c in client.get.call_args_list)
+    assert [t.id for t in tweets] == [tid for tid in ids if tid != "99"]
+
+def test_fetch_users_batches_lookups(sample_user):
+    profile = sample_user["data"]
+    names = [f"user{i}" for i in range(300)]
+    client = MagicMock()
+    client.get.side_effect = lambda endpoint, params: {
+        "data": [dict(profile, id=n[4:], username=n.upper()) for n in params["usernames"].split(",")],
+    }
+    cache = MagicMock()
+    cache.get_user.side_effect = lambda name, ttl: {"data": dict(profile, username=name)} if name == "user7" else None
+
+    users = fetch_users(client, cache, ["@" + n for n in names] + ["USER1"], ttl=86400)
+    assert client.get.call_count == 3
+    assert all(c.args[0] == "users/by" for c in client.get.call_args_list)
+    assert [u.username.lower() for u in users] == names
+    assert users[7].username == "user7"  # served from cache
+
+def test_fetch_followers_caches_each_user_once(sample_user):
+    from xr.commands.followers import fetch_following
+    profile = sample_user["data"]
+    client = MagicMock()
+    client.get.side_effect = [
+        sample_user,
+        {"data": [dict(profile, id=str(i), username=f"f{i}") for i in range(3)], "meta": {}},
+    ]
+    cache = MagicMock()
+    cache.get_user.return_value = None
+    cache.get_missing.return_value = {}
+
+    users, target = fetch_following(client, cache, "testuser", max_results=10)
+    assert len(users) == 3
+    stored = cache.put_users.call_args.args[0]
+    assert [u["username"] for u in stored] == ["f0", "f1", "f2"]
+
+def test_fetch_search_cached_uses_bulk_lookup(sample_tweet):
+    client = MagicMock()
+    cache = MagicMock()
+    cache.get_search.return_value = ["2", "1"]
+    cache.get_tweets.return_value = {
+        tid: {"data": dict(sample_tweet["data"], id=tid), "includes": sample_tweet["includes"]}
+        for tid in ("2", "1")
+    }
+
+    result = fetch_search(client, cache, "test query")
+    assert [t.id for t in result.tweets] == ["2", "1"]
+    cache.get_tweets.assert_called_once_with(["2", "1"], 604800)
+    cache.get_tweet.assert_not_called()
+    client.get.assert_not_called()
+
+def test_fetch_search_refreshes_expired_with_since_id(sample_tweet):
+    from xr.commands.search import TWITTER_EPOCH_MS
+    now_id = ((int(time.time() * 1000) - TWITTER_EPOCH_MS) << 22)
+    old_ids = [str(now_id - i) for i in range(1, 4)]  # newest first
+    new_id = str(now_id + 1)
+    client = MagicMock()
+    client.get.return_value = {
+        "data": [dict(sample_tweet["data"], id=new_id)], "includes": sample_tweet["includes"], "meta": {},
+    }
+    cache = MagicMock()
+    cache.get_search.return_value = None
+    cache.get_search_cursor.return_value = {
+        "ids": old_ids, "fetched_at": 0, "newest_id": old_ids[0], "oldest_id": old_ids[-1], "next_token": "older",
+        "complete": False,
+    }
+    cache.get_tweets.return_value = {
+        tid: {"data": dict(sample_tweet["data"], id=tid), "includes": sample_tweet["includes"]} for tid in old_ids
+    }
+
+    result = fetch_search(client, cache, "monitor", max_results=2)
+    params = client.get.call_args.args[1]
+    assert params["since_id"] == old_ids[0]
+    assert params["max_results"] == 10
+    assert [t.id for t in result.tweets] == [new_id, old_ids[0]]
+    assert result.next_token is None  # window was trimmed
+    # A smaller --max does not shrink what was cached.
+    cache.put_search.assert_called_once_with("monitor", [new_id] + old_ids[:2], None, False, "recency")
+
+    cache.get_search_cursor.return_value = dict(cache.get_search_cursor.return_value, complete=True, next_token=None)
+    cache.put_search.reset_mock()
+    result = fetch_search(client, cache, "monitor", max_results=2)
+    cache.put_search.assert_called_once_with("monitor", [new_id] + old_ids[:2], None, False, "recency")
+    result = fetch_search(client, cache, "monitor", max_results=10)
+    assert [t.id for t in result.tweets] == [new_id] + old_ids
+    cache.put_search.assert_called_with("monitor", [new_id] + old_ids, None, True, "recency")
+
+def test_fetch_thread_served_from_cache(sample_tweet):
+    from xr.commands.thread import fetch_thread
+    tweet = dict(sample_tweet["data"], conversation_id="123456")
+    client = MagicMock()
+    cache = MagicMock()
+    cache.get_tweet.return_value = {"data": tweet, "includes": sample_tweet["includes"]}
+    cache.get_search.return_value = ["200"]
+    cache.get_tweets.return_value = {"200": {"data": dict(tweet, id="200"), "includes": sample_tweet["includes"]}}
+
+    tweets, conv_id = fetch_thread(client, cache, "123456")
+    assert conv_id == "123456"
+    assert [t.id for t in tweets] == ["123456", "200"]
+    cache.get_search.assert_called_once_with("conversation_id:123456", 3600, max_results=100)
+    client.get.assert_not_called()
+
+def test_fetch_counts_requests_only_new_buckets(tmp_path):
+    from datetime import datetime, timedelta, timezone
+    from xr.cache import Cache
+    from xr.commands.counts import fetch_counts
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    iso = lambda d: d.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    days = [today - timedelta(days=i) for i in (3, 2, 1, 0)]
+    now = datetime.now(timezone.utc)
+    client = MagicMock()
+    client.get.return_value = {"data": [
+        {"start": iso(days[0]), "end": iso(days[1]), "tweet_count": 5},
+        {"start": iso(days[1]), "end": iso(days[2]), "tweet_count": 6},
+        {"start": iso(days[2]), "end": iso(days[3]), "tweet_count": 7},
+        {"start": iso(days[3]), "end": iso(now), "tweet_count": 1},
+    ]}
+    cache = Cache(tmp_path / "test.db")
+    assert fetch_counts(client, cache, "q").total == 19
+
+    client.get.return_value = {"data": [{"start": iso(days[3]), "end": iso(now), "tweet_count": 4}]}
+    result = fetch_counts(client, cache, "q", ttl=0)
+    assert client.get.call_args.args[1]["start_time"] == iso(days[3])
+    assert [b.count for b in result.buckets] == [5, 6, 7, 4]
+    assert result.total == 22
+
+def test_fetch_user_remembers_missing_handle(tmp_path):
+    from xr.api import NotFoundError
+    from xr.cache import Cache
+    client = MagicMock()
+    client.get.return_value = {"errors": [{
+        "value": "Gone", "detail": "Could not find user with username: [Gone].", "resource_type": "user",
+        "type": "https://api.twitter.com/2/problems/resource-not-found",
+    }]}
+    cache = Cache(tmp_path / "test.db")
+    for _ in range(2):
+        with pytest.raises(NotFoundError, match="Could not find user"):
+            fetch_user(client, cache, "Gone", ttl=86400)
+    client.get.assert_called_once()
+    client.get.return_value = {"data": []}
+    assert fetch_users(client, cache, ["gone", "other"], ttl=86400) == []
+    assert client.get.call_args.args[1]["usernames"] == "other"
+
+def test_fetch_tweets_skips_missing_ids(tmp_path, sample_tweet):
+    from xr.cache import Cache
+    client = MagicMock()
+    client.get.return_value = {"data": [sample_tweet["data"]], "includes": sample_tweet["includes"], "errors": [{
+        "value": "999", "resource_type": "tweet", "title": "Authorization Error",
+        "type": "https://api.twitter.com/2/problems/not-authorized-for-resource",
+    }]}
+    cache = Cache(tmp_path / "test.db")
+    assert [t.id for t in fetch_tweets(client, cache, ["123456", "999"], ttl=3600)] == ["123456"]
+    assert cache.get_missing("tweet", ["999"]) == {"999": "Authorization Error"}
+    assert fetch_tweets(client, cache, ["123456", "999"], ttl=3600)[0].id == "123456"
+    client.get.assert_called_once()
+
+def test_fetch_search_reuses_larger_cached_result(tmp_path, sample_search):
+    from xr.cache import Cache
+    client = MagicMock()
+    client.get.return_value = sample_search
+    cache = Cache(tmp_path / "test.db")
+    fetch_search(client, cache, "from:testuser lang:en", max_results=10)
+    client.get.assert_called_once()
+    # Same query in another order, asking for fewer: served from cache.
+    result = fetch_search(client, cache, "lang:en  FROM:testuser", max_results=1)
+    assert result.total == 1
+    client.get.assert_called_once()
+    # Relevancy is a different result set.
+    fetch_search(client, cache, "from:testuser lang:en", max_results=1, sort="relevancy")
+    assert client.get.call_count == 2
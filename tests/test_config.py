@@ -7,6 +7,7 @@ def test_default_config():
     assert config.save_dir is not None
     assert config.cache_enabled is True
     assert config.cache_ttl_tweets == 604800
+    assert config.cache_write_behind is False
 
 def test_config_from_toml(tmp_path):
     config_file = tmp_path / "config.toml"
@@ -21,6 +22,12 @@ enabled = false
     assert config.save_dir == Path("/tmp/xr-test")
     assert config.cache_enabled is False
 
+def test_config_http_pool_size(tmp_path):
+    config_file = tmp_path / "config.toml"
+    config_file.write_text('[http]\npool_size = 4\n')
+    config = Config.from_file(config_file)
+    assert config.http_pool_size == 4
+
 def test_config_env_override(monkeypatch, tmp_path):
     monkeypatch.setenv("XR_SAVE_DIR", str(tmp_path / "env-dir"))
     config = Config()
@@ -12,6 +12,16 @@ def test_tweet_from_api(sample_tweet):
     assert tweet.replies == 2
     assert tweet.url == "https://x.com/testuser/status/123456"
 
+def test_tweet_parse_page():
+    page = {
+        "data": [{"id": str(i), "text": f"t{i}", "author_id": str(i % 2)} for i in range(4)],
+        "includes": {"users": [{"id": "0", "username": "even", "name": "Even"}, {"id": "1", "username": "odd"}]},
+    }
+    tweets = Tweet.parse_page(page)
+    assert [(t.id, t.username) for t in tweets] == [("0", "even"), ("1", "odd"), ("2", "even"), ("3", "odd")]
+    assert [t.id for t in Tweet.parse_page(page, 2)] == ["0", "1"]
+    assert Tweet.parse_page({"meta": {"result_count": 0}}) == []
+
 def test_user_from_api(sample_user):
     user = User.from_api(sample_user["data"])
     assert user.id == "789"
@@ -0,0 +1,38 @@
+"""Tests for query canonicalization and local query parsing."""
+import pytest
+from xr.query import QueryError, canonical_query, parse_query
+
+def test_parse_terms_and_phrases():
+    q = parse_query('bitcoin "spot etf" OR halving -scam')
+    assert q.match == '"bitcoin" "spot etf" OR "halving"'
+    assert q.exclude == '"scam"'
+    assert q.where == []
+
+def test_parse_operators():
+    q = parse_query("from:@Naval lang:EN -is:retweet has:links since:2026-01-01 until:2026-02-01")
+    assert q.match == ""
+    assert q.where == [
+        "i.author_id IN (SELECT user_id FROM users WHERE username = ?)",
+        "i.lang = ?",
+        "i.is_retweet = 0",
+        "i.has_links = 1",
+        "i.created_at >= ?",
+        "i.created_at < ?",
+    ]
+    assert q.params[:2] == ["naval", "en"]
+    assert q.params[3] - q.params[2] == 31 * 86400
+
+def test_parse_rejects_unknown_operator():
+    with pytest.raises(QueryError):
+        parse_query("url:example.com")
+    with pytest.raises(QueryError):
+        parse_query("since:yesterday")
+
+def test_canonical_query_orders_and_terms():
+    assert canonical_query("from:a lang:en") == canonical_query("  LANG:en   from:A ")
+    assert canonical_query('Bitcoin "Spot ETF" -is:retweet bitcoin') == '"spot etf" -is:retweet bitcoin'
+    # OR and grouping depend on order; lowercase "or" is just a word.
+    assert canonical_query("a b OR c") == "a b OR c"
+    assert canonical_query("a b OR c") != canonical_query("c OR a b")
+    assert canonical_query("cats or dogs") == "cats dogs or"
+    assert canonical_query("(a OR b) c") == "(a OR b) c"
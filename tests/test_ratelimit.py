@@ -0,0 +1,47 @@
+"""Tests for the shared rate-limit budget."""
+import time
+from unittest.mock import patch
+from xr.ratelimit import RateLimiter, endpoint_key
+
+def _headers(limit, remaining, reset_at):
+    return {
+        "x-rate-limit-limit": str(limit),
+        "x-rate-limit-remaining": str(remaining),
+        "x-rate-limit-reset": str(reset_at),
+    }
+
+def test_endpoint_key_collapses_ids():
+    assert endpoint_key("users/123/tweets") == "users/:id/tweets"
+    assert endpoint_key("users/by/username/naval") == "users/by/username/:username"
+    assert endpoint_key("tweets/search/recent") == "tweets/search/recent"
+
+def test_unknown_endpoint_does_not_wait(tmp_path):
+    limiter = RateLimiter(tmp_path / "rl.db")
+    with patch("xr.ratelimit.time.sleep") as sleep:
+        limiter.acquire("tweets/1")
+    sleep.assert_not_called()
+
+def test_budget_shared_across_instances(tmp_path):
+    reset_at = int(time.time()) + 900
+    a = RateLimiter(tmp_path / "rl.db")
+    b = RateLimiter(tmp_path / "rl.db")
+    a.record("users/1/tweets", _headers(100, 50, reset_at))
+    a.acquire("users/2/tweets")
+    b.acquire("users/3/tweets")
+    row = b._db().execute("SELECT remaining FROM rate_limits").fetchone()
+    assert row == (48,)
+    # A stale response from the same window must not restore spent budget.
+    b.record("users/1/tweets", _headers(100, 49, reset_at))
+    assert b._db().execute("SELECT remaining FROM rate_limits").fetchone() == (48,)
+
+def test_exhausted_budget_waits_for_reset(tmp_path):
+    limiter = RateLimiter(tmp_path / "rl.db")
+    limiter.record("tweets/search/recent", _headers(450, 0, int(time.time()) + 60))
+    assert limiter._reserve("tweets/search/recent") > 59
+
+def test_low_budget_is_paced(tmp_path):
+    limiter = RateLimiter(tmp_path / "rl.db")
+    limiter.record("tweets/search/recent", _headers(100, 5, int(time.time()) + 100))
+    assert limiter._reserve("tweets/search/recent") == 0
+    wait = limiter._reserve("tweets/search/recent")
+    assert 15 < wait <= 20  # ~100s spread over the 5 remaining calls